@@ -1,14 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor
 from typing import Literal
 
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
 from langgraph.types import interrupt
 from pydantic import BaseModel, Field
 
+from src.speculation import observe_attributes, take_candidates
 from src.utils import validate_user_input, load_config
 
 CONFIG = load_config()
 
 
+def build_final_prompt(prompt_attributes: dict[str, str]) -> str:
+    final_prompt = (
+        f"Please generate {CONFIG['NO_OF_SONGS']} song recommendations "
+        f"based on the following criteria:\n"
+    )
+    for attr, value in prompt_attributes.items():
+        final_prompt += f"{attr}: {value}\n"
+    return final_prompt
+
+
+def check_format(user_input: str, config: dict) -> str | None:
+    """Returns the reason why user_input can never be used (empty or too long), None if it can"""
+    if not user_input or not user_input.strip():
+        return "Input cannot be empty"
+    if len(user_input) > config['MAX_CHARS']:
+        return f"Input too long (max {config['MAX_CHARS']} characters)"
+    return None
+
+
+def check_attribute(attribute: str, user_input: str, config: dict) -> str | None:
+    """Returns the reason why user_input is not a valid value of attribute, None if it is valid"""
+    format_error = check_format(user_input, config)
+    if format_error:
+        return format_error
+    if not validate_user_input(attribute, user_input.strip(), config["PROMPT_VALIDATOR_MODEL"], config):
+        return f"Invalid {attribute}"
+    return None
+
+
 def create_prompt_builder_graph(config: dict):
     class PromptBuilderState(BaseModel):
         """State for the prompt building graph"""
@@ -18,25 +50,26 @@ def create_prompt_builder_graph(config: dict):
         validation_attempts: int = Field(default=0)
         messages: list[str] = Field(default_factory=list)
         final_prompt: str = Field(default="")
+        speculative_candidates: list[dict] = Field(default_factory=list)
         max_attempts: int = Field(default=config["MAX_ATTEMPTS"])
         is_complete: bool = Field(default=False)
 
-    def collect_attributes_node(state: PromptBuilderState) -> PromptBuilderState:
+    def collect_attributes_node(state: PromptBuilderState, config: RunnableConfig) -> PromptBuilderState:
         """Collects and validates one attribute at a time."""
         current_idx = state.current_attribute_index
         attributes = state.attributes_to_collect
+        run_key = config.get("configurable", {}).get("thread_id")
 
         if current_idx >= len(attributes):
             # All done - finalize prompt
-            state.final_prompt = (
-                f"Please generate {CONFIG['NO_OF_SONGS']} song recommendations "
-                f"based on the following criteria:\n"
-            )
-            for attr, value in state.prompt_attributes.items():
-                state.final_prompt += f"{attr}: {value}\n"
+            state.final_prompt = build_final_prompt(state.prompt_attributes)
+            state.speculative_candidates = take_candidates(run_key, state.prompt_attributes) or []
             state.is_complete = True
             return state
 
+        # Speculate on the answers given so far while the user types the next one
+        observe_attributes(run_key, state.prompt_attributes, CONFIG)
+
         current_attribute = attributes[current_idx]
         max_attempts = state.max_attempts
         attempts = state.validation_attempts
@@ -71,8 +104,7 @@ def create_prompt_builder_graph(config: dict):
 
         # Validate with LLM
         state.messages.append("🔍 Validating your input...")
-        # is_valid = validate_user_input(current_attribute, user_input.strip())
-        is_valid = True #TODO: Revert to real validation
+        is_valid = validate_user_input(current_attribute, user_input.strip(), CONFIG["PROMPT_VALIDATOR_MODEL"], CONFIG)
         if is_valid:
             state.messages.append(f"✅ Valid {current_attribute}")
             state.prompt_attributes[current_attribute] = user_input.strip()
@@ -90,7 +122,7 @@ def create_prompt_builder_graph(config: dict):
                 )
             else:
                 state.messages.append(
-                    f"❌ Maximum attempts reached. Using your last input anyway."
+                    "❌ Maximum attempts reached. Using your last input anyway."
                 )
                 state.prompt_attributes[current_attribute] = user_input.strip()
                 state.current_attribute_index = current_idx + 1
@@ -123,4 +155,103 @@ def create_prompt_builder_graph(config: dict):
     return workflow.compile()
 
 
-graph = create_prompt_builder_graph(CONFIG)
+def create_single_shot_prompt_builder_graph(config: dict):
+    """
+    Alternative intake: all SONG_ATTRIBUTES arrive in one prompt_attributes payload and are validated concurrently.
+    The graph interrupts again only with the fields that failed, expecting a dict of corrected values back.
+    """
+    class SingleShotPromptBuilderState(BaseModel):
+        """State for the single-shot prompt building graph"""
+        attributes_to_collect: list[str] = Field(default_factory=lambda: config["SONG_ATTRIBUTES"])
+        prompt_attributes: dict[str, str] = Field(default_factory=dict)
+        invalid_attributes: dict[str, str] = Field(default_factory=dict)
+        attributes_to_validate: list[str] | None = Field(default=None)
+        validation_attempts: int = Field(default=0)
+        messages: list[str] = Field(default_factory=list)
+        final_prompt: str = Field(default="")
+        max_attempts: int = Field(default=config["MAX_ATTEMPTS"])
+        is_complete: bool = Field(default=False)
+
+    def validate_attributes_node(state: SingleShotPromptBuilderState) -> SingleShotPromptBuilderState:
+        """Validates all pending attributes at once, LLM fallbacks run in parallel."""
+        pending = state.attributes_to_validate
+        if pending is None:
+            pending = state.attributes_to_collect
+
+        values = {attr: str(state.prompt_attributes.get(attr, "")) for attr in pending}
+        with ThreadPoolExecutor(max_workers=max(len(pending), 1)) as executor:
+            reasons = dict(zip(pending, executor.map(lambda attr: check_attribute(attr, values[attr], config), pending)))
+
+        state.invalid_attributes = {attr: reason for attr, reason in reasons.items() if reason}
+        for attr in pending:
+            if attr in state.invalid_attributes:
+                state.messages.append(f"❌ {state.invalid_attributes[attr]}")
+            else:
+                state.messages.append(f"✅ Valid {attr}")
+                state.prompt_attributes[attr] = values[attr].strip()
+
+        if state.invalid_attributes and state.validation_attempts + 1 >= state.max_attempts:
+            # Like the interactive intake, an empty or too long value is asked for again however many attempts it took
+            accepted = [attr for attr in state.invalid_attributes if check_format(values[attr], config) is None]
+            if accepted:
+                state.messages.append("❌ Maximum attempts reached. Using your last input anyway.")
+            for attr in accepted:
+                state.prompt_attributes[attr] = values[attr].strip()
+                del state.invalid_attributes[attr]
+
+        if not state.invalid_attributes:
+            # Keep the attribute order of SONG_ATTRIBUTES in the prompt
+            state.prompt_attributes = {attr: state.prompt_attributes[attr] for attr in state.attributes_to_collect}
+            state.final_prompt = build_final_prompt(state.prompt_attributes)
+            state.is_complete = True
+
+        return state
+
+    def request_corrections_node(state: SingleShotPromptBuilderState) -> SingleShotPromptBuilderState:
+        """Asks only for the fields that failed validation."""
+        corrections = interrupt({
+            "invalid_attributes": state.invalid_attributes,
+            "remaining_attempts": max(state.max_attempts - state.validation_attempts - 1, 0)
+        })
+
+        state.validation_attempts += 1
+        state.attributes_to_validate = list(state.invalid_attributes)
+        for attr in state.invalid_attributes:
+            state.prompt_attributes[attr] = str(corrections.get(attr, ""))
+        return state
+
+    def route_after_validation(state: SingleShotPromptBuilderState) -> Literal["request_corrections", "end"]:
+        if state.is_complete:
+            return "end"
+        return "request_corrections"
+
+    workflow = StateGraph(SingleShotPromptBuilderState)
+
+    workflow.add_node("validate_attributes", validate_attributes_node)
+    workflow.add_node("request_corrections", request_corrections_node)
+
+    workflow.set_entry_point("validate_attributes")
+    workflow.add_conditional_edges(
+        "validate_attributes",
+        route_after_validation,
+        {
+            "request_corrections": "request_corrections",
+            "end": END
+        }
+    )
+    workflow.add_edge("request_corrections", "validate_attributes")
+
+    return workflow.compile()
+
+
+_graphs = {}
+
+
+def __getattr__(name):
+    """Compile the graphs referenced from langgraph.json on first access instead of at import"""
+    factories = {"graph": create_prompt_builder_graph, "single_shot_graph": create_single_shot_prompt_builder_graph}
+    if name not in factories:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if name not in _graphs:
+        _graphs[name] = factories[name](CONFIG)
+    return _graphs[name]
@@ -1,21 +1,17 @@
 import logging
-from datetime import datetime
+import uuid
 from functools import partial
 
 from dotenv import load_dotenv
-from langchain.chat_models import init_chat_model
 from langgraph.graph import StateGraph, START, END
 
-from prompt_builder import create_prompt_builder_graph
+import prompt_builder
+from src.profiling import profiled
+from src.registry import ModelRegistry, get_provider_configs
 from src.schemas import State
-from src.tools import tools
-from src.utils import load_config, validate_apikeys, get_model_response
+from src.utils import load_config, validate_apikeys, aget_model_response, name_playlist, new_run_timestamp
 from src.youtube_integration import analyze_responses
 
-CONFIG = load_config()
-
-prompt_builder_graph = create_prompt_builder_graph(CONFIG)
-
 # Setup stuff
 
 logging.basicConfig(
@@ -29,50 +25,52 @@ load_dotenv()
 validate_apikeys()
 CONFIG = load_config()
 
-# Build tools
+# "single_shot" takes all prompt attributes in one payload instead of one interrupt per attribute
+if CONFIG.get("INTAKE_MODE", "interactive") == "single_shot":
+    prompt_builder_graph = prompt_builder.single_shot_graph
+else:
+    prompt_builder_graph = prompt_builder.graph
 
+# Chat models (and their tools) are built on first use by each voter
+MODELS = ModelRegistry(CONFIG)
 
-MODELS = {m: init_chat_model(model=f"{m}:{CONFIG[f'{m.upper()}_MODEL']}",
-                             temperature=CONFIG["TEMPERATURE"]).bind_tools(tools, tool_choice="web_search")
-          for m in ['anthropic', 'google_genai', 'openai']}
 
-def map_prompt_to_question(subgraph_output):
-    """Map PromptBuilderState output to main State"""
+def map_prompt_to_question(state: State) -> dict:
+    """Map PromptBuilderState output to main State and open the per-run context"""
+    run_id = uuid.uuid4().hex
     return {
-        "user_question": subgraph_output.get("final_prompt", ""),
-        "prompt_attributes": subgraph_output.get("prompt_attributes", {})
+        "user_question": state.get("final_prompt", ""),
+        # Setup timestamp to use it to align on same artifacts for single run
+        "current_time": new_run_timestamp(run_id),
+        "run_id": run_id
     }
 
+
 # Build the main graph
 graph = StateGraph(State)
 
-# Setup timestamp to use it to align on same artifacts for single run
-current_time = datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
-
 # Add nodes
-graph.add_node("prompt_builder", prompt_builder_graph, output=map_prompt_to_question)
-graph.add_node("anthropic",
-               partial(get_model_response, model_provider="anthropic", current_time=current_time, models=MODELS,
-                       script_config=CONFIG))
-graph.add_node("openai", partial(get_model_response, model_provider="openai", current_time=current_time, models=MODELS,
-                                 script_config=CONFIG))
-graph.add_node("google", partial(get_model_response, model_provider="google_genai", current_time=current_time, models=MODELS,
-                                 script_config=CONFIG))
-graph.add_node("analyze", partial(analyze_responses, current_time=current_time))
+graph.add_node("prompt_builder", prompt_builder_graph)
+# profiled() returns the node itself unless PROFILING / MUSICOLOGY_PROFILE switches profiling on
+graph.add_node("start_run", profiled(map_prompt_to_question, "start_run", CONFIG))
+graph.add_node("playlist_name", profiled(partial(name_playlist, script_config=CONFIG), "playlist_name", CONFIG))
+graph.add_node("analyze", profiled(partial(analyze_responses, script_config=CONFIG), "analyze", CONFIG))
 
 # Add edges
-# START -> prompt_builder
+# START -> prompt_builder -> start_run
 graph.add_edge(START, "prompt_builder")
-
-# prompt_builder -> all three models in parallel
-graph.add_edge("prompt_builder", "anthropic")
-graph.add_edge("prompt_builder", "openai")
-graph.add_edge("prompt_builder", "google")
-
-# All models -> analysis
-graph.add_edge("anthropic", "analyze")
-graph.add_edge("openai", "analyze")
-graph.add_edge("google", "analyze")
+graph.add_edge("prompt_builder", "start_run")
+
+# start_run -> every voter from PROVIDERS in parallel -> analysis
+for provider in get_provider_configs(CONFIG):
+    voter = partial(aget_model_response, model_provider=provider["NAME"], models=MODELS, script_config=CONFIG)
+    graph.add_node(provider["NAME"], profiled(voter, provider["NAME"], CONFIG))
+    graph.add_edge("start_run", provider["NAME"])
+    graph.add_edge(provider["NAME"], "analyze")
+
+# Playlist naming only needs the user question, so it runs alongside the voters
+graph.add_edge("start_run", "playlist_name")
+graph.add_edge("playlist_name", "analyze")
 
 graph.add_edge("analyze", END)
 
@@ -0,0 +1,170 @@
+import numpy as np
+import pandas as pd
+
+from src.entity_resolution import SongIndex
+
+SONG_COLUMNS = ['song_title', 'artist', 'album', 'year']
+SCORING_STRATEGIES = ['points', 'borda', 'rrf']
+
+# Constant from the original reciprocal rank fusion paper (Cormack et al., 2009)
+RRF_K = 60
+
+
+class BallotBatch:
+    """
+    Columnar batch of voter ballots - one row per recommendation, one numpy array per column.
+    Ballots of many voters (and many runs) live in the same preallocated arrays so scoring is fully vectorized.
+    """
+
+    def __init__(self, voters, voter_codes, run_codes, runs, ranks, positions, ballot_sizes, songs):
+        self.voters = voters
+        self.voter_codes = voter_codes
+        self.run_codes = run_codes
+        self.runs = runs
+        self.ranks = ranks
+        self.positions = positions
+        self.ballot_sizes = ballot_sizes
+        self.songs = songs
+
+    def __len__(self):
+        return len(self.ranks)
+
+
+def build_ballot_batch(runs):
+    """
+    Build a BallotBatch from {run_id: {voter: RecommendationResponse dict}}.
+    For a single run use build_ballot_batch({current_time: ballots}).
+    """
+    run_ids = list(runs)
+    voters = sorted({voter for ballots in runs.values() for voter in ballots})
+    voter_index = {voter: code for code, voter in enumerate(voters)}
+
+    size = sum(len(ballot['recommendations']) for ballots in runs.values() for ballot in ballots.values())
+    voter_codes = np.empty(size, dtype=np.int32)
+    run_codes = np.empty(size, dtype=np.int32)
+    ranks = np.empty(size, dtype=np.float64)
+    positions = np.empty(size, dtype=np.int32)
+    ballot_sizes = np.empty(size, dtype=np.int32)
+    songs = {column: np.empty(size, dtype=np.int64 if column == 'year' else object) for column in SONG_COLUMNS}
+
+    row = 0
+    for run_code, run_id in enumerate(run_ids):
+        for voter, ballot in runs[run_id].items():
+            # Position 0 is the voter's strongest recommendation
+            recommendations = sorted(ballot['recommendations'], key=lambda r: r['rank'], reverse=True)
+            end = row + len(recommendations)
+
+            voter_codes[row:end] = voter_index[voter]
+            run_codes[row:end] = run_code
+            positions[row:end] = np.arange(len(recommendations))
+            ballot_sizes[row:end] = len(recommendations)
+            for offset, recommendation in enumerate(recommendations):
+                ranks[row + offset] = recommendation['rank']
+                for column in SONG_COLUMNS:
+                    songs[column][row + offset] = recommendation[column]
+            row = end
+
+    return BallotBatch(voters, voter_codes, run_codes, run_ids, ranks, positions, ballot_sizes, songs)
+
+
+def score_ballots(batch, strategy='points', weights=None):
+    """
+    Points every row of the batch contributes to its song.
+
+    Strategies:
+    - points: the rank assigned by the voter (NO_OF_SONGS for the strongest recommendation)
+    - borda: ballot size minus position, independent of the voter's own numbering
+    - rrf: reciprocal rank fusion, 1 / (RRF_K + position), position counted from 1
+
+    weights: optional {voter: multiplier}, voters missing from it get 1.0
+    """
+    if strategy == 'points':
+        scores = batch.ranks.copy()
+    elif strategy == 'borda':
+        scores = (batch.ballot_sizes - batch.positions).astype(np.float64)
+    elif strategy == 'rrf':
+        scores = 1.0 / (RRF_K + batch.positions + 1)
+    else:
+        raise ValueError(f"Unknown scoring strategy '{strategy}', choose one of {SCORING_STRATEGIES}")
+
+    if weights:
+        voter_weights = np.array([weights.get(voter, 1.0) for voter in batch.voters], dtype=np.float64)
+        scores *= voter_weights[batch.voter_codes]
+
+    return scores
+
+
+def song_codes(batch):
+    """Integer id of every row's song (exact match on song_title, artist, album and year)"""
+    keys = pd.MultiIndex.from_arrays([batch.songs[column] for column in SONG_COLUMNS])
+    codes, _ = pd.factorize(keys)
+    return codes
+
+
+def canonical_song_codes(batch, index=None):
+    """
+    Integer id of every row's canonical song, so spelling variants of the same song
+    ("The Beatles" vs "Beatles", remaster suffixes, different album or year) share their votes.
+    Songs of the same ballot (run and voter) are never merged with each other.
+    """
+    index = index or SongIndex()
+    keys = [index.resolve(title, artist, ballot=(int(run_code), int(voter_code)))
+            for title, artist, run_code, voter_code in zip(batch.songs['song_title'], batch.songs['artist'],
+                                                           batch.run_codes, batch.voter_codes)]
+    codes, _ = pd.factorize(np.asarray(keys, dtype=object))
+    return codes
+
+
+def aggregate_ballots(batch, strategy='points', weights=None, codes=None):
+    """
+    Sum the scores per song and return the ranked table with columns
+    song_title, artist, album, year, total_points, votes, voters (plus run_id when the batch holds several runs).
+    """
+    if codes is None:
+        codes = song_codes(batch)
+    scores = score_ballots(batch, strategy, weights)
+
+    # Songs of different runs never add up
+    group_keys = batch.run_codes.astype(np.int64) * (codes.max(initial=0) + 1) + codes
+    groups, first_rows = np.unique(group_keys, return_index=True)
+    group_of_row = np.searchsorted(groups, group_keys)
+
+    result = pd.DataFrame({column: batch.songs[column][first_rows] for column in SONG_COLUMNS})
+    result['total_points'] = np.bincount(group_of_row, weights=scores, minlength=len(groups))
+    result['votes'] = np.bincount(group_of_row, minlength=len(groups))
+    result['voters'] = (
+        pd.Series(np.asarray(batch.voters, dtype=object)[batch.voter_codes]).groupby(group_of_row).agg(', '.join).values
+        if len(batch) else []
+    )
+
+    if len(batch.runs) > 1:
+        result.insert(0, 'run_id', np.asarray(batch.runs, dtype=object)[batch.run_codes[first_rows]])
+        result = result.sort_values(by=['run_id', 'total_points'], ascending=[True, False], kind='stable')
+    else:
+        result = result.sort_values(by='total_points', ascending=False, kind='stable')
+
+    return result.reset_index(drop=True)
+
+
+def provider_weights(script_config) -> dict:
+    """{voter: WEIGHT} of the PROVIDERS in config.json, 1.0 when a provider has no WEIGHT"""
+    return {provider["NAME"]: provider.get("WEIGHT", 1.0) for provider in script_config.get("PROVIDERS", [])}
+
+
+def aggregate_configured_ballots(batch, script_config):
+    """
+    aggregate_ballots with the ENTITY_RESOLUTION, SCORING_STRATEGY and provider WEIGHTs of config.json,
+    so every tally of a run (streamed or final) ranks the same songs the same way.
+    """
+    resolution_config = script_config.get("ENTITY_RESOLUTION", {})
+    codes = None
+    if resolution_config.get("ENABLED", False):
+        # Merge spelling variants of the same song before counting votes
+        codes = canonical_song_codes(batch, SongIndex(resolution_config.get("SIMILARITY_THRESHOLD", 0.88)))
+
+    return aggregate_ballots(
+        batch,
+        strategy=script_config.get("SCORING_STRATEGY", "points"),
+        weights=provider_weights(script_config),
+        codes=codes
+    )
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from src.entity_resolution import song_key
+
+DEFAULT_CACHE_PATH = Path(__file__).parent.parent / ".cache" / "musicology.sqlite"
+
+
+class SQLiteCache:
+    """
+    Tiny persistent key/value store on top of SQLite.
+    Entries expire after ttl_seconds and the least recently used ones are evicted above max_entries.
+    Values are stored as JSON, so None is a legitimate cached value - use a sentinel default to tell it from a miss.
+    """
+
+    def __init__(self, table, path=DEFAULT_CACHE_PATH, ttl_seconds=None, max_entries=None):
+        self.table = table
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_last_access ON {self.table} (last_access)")
+
+    def _connect(self):
+        # New connection per operation keeps the cache usable from threads and separate processes
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return default
+
+            value, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                return default
+
+            conn.execute(f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def set(self, key, value):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        if self.ttl_seconds is not None:
+            conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (now - self.ttl_seconds,))
+
+        if self.max_entries is not None:
+            conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f"SELECT key FROM {self.table} ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Casefold and collapse whitespace so cosmetic differences in final_prompt hit the same entry"""
+    return " ".join(prompt.casefold().split())
+
+
+def make_response_cache_key(model_provider, model_id, temperature, system_prompt, final_prompt) -> str:
+    system_prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+    key_parts = [model_provider, model_id, temperature, system_prompt_hash, normalize_prompt(final_prompt)]
+    return hashlib.sha256(json.dumps(key_parts).encode("utf-8")).hexdigest()
+
+
+class VideoIdCache:
+    """
+    Persistent index from the canonical song key (see entity_resolution.song_key) to YouTube videoId.
+    Songs with no search result are remembered as well, but expire sooner so they get retried.
+    """
+
+    _MISS = object()
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_seconds=None, negative_ttl_seconds=None, max_entries=None):
+        self.found = SQLiteCache("video_ids", path=path, ttl_seconds=ttl_seconds, max_entries=max_entries)
+        self.not_found = SQLiteCache("video_misses", path=path, ttl_seconds=negative_ttl_seconds,
+                                     max_entries=max_entries)
+
+    def lookup(self, song_title, artist):
+        """Returns (hit, video_id) - video_id is None for a cached negative result"""
+        key = song_key(song_title, artist)
+
+        video_id = self.found.get(key, self._MISS)
+        if video_id is not self._MISS:
+            return True, video_id
+
+        if self.not_found.get(key, self._MISS) is not self._MISS:
+            return True, None
+
+        return False, None
+
+    def store(self, song_title, artist, video_id):
+        key = song_key(song_title, artist)
+        if video_id:
+            self.found.set(key, video_id)
+        else:
+            self.not_found.set(key, None)
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache(script_config):
+    """Process-wide RecommendationResponse cache configured by RESPONSE_CACHE in config.json (None if disabled)"""
+    cache_config = script_config.get("RESPONSE_CACHE", {})
+    if not cache_config.get("ENABLED", False):
+        return None
+
+    path = cache_config.get("PATH", DEFAULT_CACHE_PATH)
+    with _caches_lock:
+        if ("responses", path) not in _caches:
+            logging.info(f"Using response cache at {path}")
+            _caches[("responses", path)] = SQLiteCache(
+                "model_responses",
+                path=path,
+                ttl_seconds=cache_config.get("TTL_SECONDS"),
+                max_entries=cache_config.get("MAX_ENTRIES")
+            )
+        return _caches[("responses", path)]
+
+
+def get_video_cache(script_config):
+    """Process-wide song -> videoId cache configured by VIDEO_CACHE in config.json (None if disabled)"""
+    cache_config = script_config.get("VIDEO_CACHE", {})
+    if not cache_config.get("ENABLED", False):
+        return None
+
+    path = cache_config.get("PATH", DEFAULT_CACHE_PATH)
+    with _caches_lock:
+        if ("videos", path) not in _caches:
+            logging.info(f"Using video cache at {path}")
+            _caches[("videos", path)] = VideoIdCache(
+                path=path,
+                ttl_seconds=cache_config.get("TTL_SECONDS"),
+                negative_ttl_seconds=cache_config.get("NEGATIVE_TTL_SECONDS"),
+                max_entries=cache_config.get("MAX_ENTRIES")
+            )
+        return _caches[("videos", path)]
@@ -0,0 +1,137 @@
+import re
+import unicodedata
+from difflib import SequenceMatcher
+
+# "feat. X", "ft X", "featuring X" up to the end of the string or a closing bracket
+FEATURING_PATTERN = re.compile(r"[\(\[]?\s*\b(feat|ft|featuring)\b\.?\s.*?([\)\]]|$)")
+# "(Remastered 2009)", "[Live]", "- 2011 Remaster", "- Radio Edit" ...
+VERSION_WORDS = r"(remaster(ed)?|live|version|edit|mono|stereo|mix|demo|acoustic|deluxe|bonus track)"
+BRACKETED_VERSION_PATTERN = re.compile(rf"[\(\[][^\)\]]*\b{VERSION_WORDS}\b[^\)\]]*[\)\]]")
+DASHED_VERSION_PATTERN = re.compile(rf"\s-\s[^-]*\b{VERSION_WORDS}\b.*$")
+NON_ALPHANUMERIC_PATTERN = re.compile(r"[^0-9a-z]+")
+# "Pt. 2" vs "Pt. 1", "No. 5" vs "No. 9", "Part II" vs "Part III" - one character apart, but different songs
+ROMAN_NUMERAL_PATTERN = re.compile(r"^m{0,3}(cm|cd|d?c{0,3})(xc|xl|l?x{0,3})(ix|iv|v?i{0,3})$")
+NOT_ROMAN_NUMERALS = {"mix", "did", "mid", "dim", "lid", "mild", "mi", "di", "li", "cd", "dc", "mc"}
+
+
+def _fold(text) -> str:
+    """Casefold and strip accents so 'Beyoncé' and 'BEYONCE' compare equal"""
+    decomposed = unicodedata.normalize("NFKD", str(text).casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def _squash(text) -> str:
+    return NON_ALPHANUMERIC_PATTERN.sub(" ", text).strip()
+
+
+def normalize_title(song_title) -> str:
+    title = _fold(song_title)
+    title = BRACKETED_VERSION_PATTERN.sub(" ", title)
+    title = DASHED_VERSION_PATTERN.sub(" ", title)
+    title = FEATURING_PATTERN.sub(" ", title)
+    return _squash(title)
+
+
+def normalize_artist(artist) -> str:
+    name = FEATURING_PATTERN.sub(" ", _fold(artist))
+    name = _squash(name.replace("&", " and "))
+    if name.startswith("the "):
+        name = name[4:]
+    return name
+
+
+def numeral_tokens(normalized_title) -> frozenset:
+    """Digit and roman numeral tokens of a normalized title, which must match exactly for songs to be merged"""
+    return frozenset(
+        token for token in normalized_title.split()
+        if token.isdigit() or (len(token) <= 4 and token not in NOT_ROMAN_NUMERALS
+                               and ROMAN_NUMERAL_PATTERN.match(token))
+    )
+
+
+def song_key(song_title, artist) -> str:
+    """Deterministic normalized key of a song, shared by vote aggregation and the YouTube video cache"""
+    return f"{normalize_title(song_title)}|{normalize_artist(artist)}"
+
+
+class SongIndex:
+    """
+    Maps song candidates to canonical song keys.
+
+    Candidates with the same normalized title and artist resolve in O(1).
+    The rest are only fuzzy-compared with members of the blocks they share: title prefix with artist initials,
+    and artist prefix with the first or last title word. Only the first BLOCK_LIMIT members of a block are compared,
+    so the cost stays linear in the number of candidates even for artists with thousands of songs.
+    A fuzzy merge needs the same numbers in both titles ("Pt. 1" never merges with "Pt. 2"),
+    and never joins two candidates of the same ballot, since one voter does not list a song twice.
+    """
+
+    BLOCK_PREFIX = 4
+    BLOCK_LIMIT = 32
+
+    def __init__(self, similarity_threshold=0.88):
+        self.similarity_threshold = similarity_threshold
+        self.canonical = {}  # normalized key -> canonical key
+        self.blocks = {}  # block key -> list of (title, artist, numeral tokens of title, canonical key)
+        self.ballots = {}  # canonical key -> ballots it was resolved for
+
+    def _block_keys(self, title, artist):
+        words = title.split() or [""]
+        artist_prefix = artist[:self.BLOCK_PREFIX]
+        # A misspelt artist still shares the title block, a misspelt title word still shares one of the word blocks
+        return list(dict.fromkeys([
+            ("title", title[:self.BLOCK_PREFIX], artist[:2]),
+            ("word", artist_prefix, words[0]),
+            ("word", artist_prefix, words[-1])
+        ]))
+
+    def _similarity(self, left, right, threshold=0.0):
+        """ratio() of left and right, 0.0 as soon as its cheap upper bounds fall below threshold"""
+        # Upper bound of ratio() from the lengths alone, before SequenceMatcher indexes right
+        if 2 * min(len(left), len(right)) < threshold * (len(left) + len(right)):
+            return 0.0
+        matcher = SequenceMatcher(None, left, right)
+        if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+            return 0.0
+        return matcher.ratio()
+
+    def resolve(self, song_title, artist, ballot=None) -> str:
+        """Canonical key of a song. ballot: any hashable id of the ballot the candidate comes from"""
+        title, artist = normalize_title(song_title), normalize_artist(artist)
+        key = f"{title}|{artist}"
+        if key in self.canonical:
+            best_key = self.canonical[key]
+        else:
+            best_key = self._fuzzy_match(title, artist, key, ballot)
+            self.canonical[key] = best_key
+            if best_key == key:
+                entry = (title, artist, numeral_tokens(title), key)
+                for block_key in self._block_keys(title, artist):
+                    self.blocks.setdefault(block_key, []).append(entry)
+
+        if ballot is not None:
+            self.ballots.setdefault(best_key, set()).add(ballot)
+        return best_key
+
+    def _fuzzy_match(self, title, artist, key, ballot):
+        numerals = numeral_tokens(title)
+        best_key, best_score = key, self.similarity_threshold
+        seen = set()
+        for block_key in self._block_keys(title, artist):
+            for candidate_title, candidate_artist, candidate_numerals, candidate_key in \
+                    self.blocks.get(block_key, [])[:self.BLOCK_LIMIT]:
+                if candidate_key in seen:
+                    continue
+                seen.add(candidate_key)
+
+                if candidate_numerals != numerals:
+                    continue
+                if ballot is not None and ballot in self.ballots.get(candidate_key, ()):
+                    continue
+
+                score = self._similarity(title, candidate_title, best_score)
+                if score >= best_score:
+                    score = min(score, self._similarity(artist, candidate_artist, best_score))
+                if score >= best_score:
+                    best_key, best_score = candidate_key, score
+        return best_key
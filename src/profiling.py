@@ -0,0 +1,197 @@
+import cProfile
+import functools
+import inspect
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# MUSICOLOGY_PROFILE=sampling|deterministic|off overrides PROFILING.MODE from config.json
+PROFILE_ENV = "MUSICOLOGY_PROFILE"
+MODES = ("sampling", "deterministic")
+
+
+def get_profiling_mode(script_config):
+    """Profiler to wrap the graph nodes in, None when profiling is off"""
+    profiling_config = (script_config or {}).get("PROFILING", {})
+    mode = os.getenv(PROFILE_ENV)
+    if mode is None:
+        if not profiling_config.get("ENABLED", False):
+            return None
+        mode = profiling_config.get("MODE", "sampling")
+
+    mode = mode.strip().lower()
+    if mode in ("", "0", "off", "false"):
+        return None
+    if mode not in MODES:
+        logging.warning(f"Unknown profiling mode {mode!r}, expected one of {MODES}. Profiling is off")
+        return None
+    return mode
+
+
+class StackSampler:
+    """
+    Samples the call stack of one thread every `interval` seconds from a background thread.
+    Stacks are counted in collapsed form (outermost;...;innermost), as flamegraph.pl and speedscope read them.
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{Path(code.co_filename).stem}:{code.co_name}:{code.co_firstlineno}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self, top=25) -> str:
+        """Top functions by self samples (the innermost frame of a stack)"""
+        self_samples = Counter()
+        for stack, count in self.stacks.items():
+            self_samples[stack.rsplit(";", 1)[-1]] += count
+
+        total = sum(self_samples.values())
+        lines = [f"{total} samples every {self.interval * 1000:g} ms", f"{'self':>8} {'self %':>7}  function"]
+        for function, count in self_samples.most_common(top):
+            lines.append(f"{count:>8} {100 * count / total:>6.1f}%  {function}")
+        return "\n".join(lines) + "\n"
+
+
+class NodeProfile:
+    """One profiled execution of a graph node, in either of the MODES"""
+
+    def __init__(self, mode, interval=0.005, top=25):
+        self.mode = mode
+        self.interval = interval
+        self.top = top
+        self.profiler = None
+        self.sampler = None
+        self.started = None
+        self.wall_seconds = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        if self.mode == "deterministic":
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError as e:
+                # Python 3.12+ runs one cProfile at a time, e.g. the voters overlap on the event loop
+                logging.warning(f"Deterministic profiler not started: {e}. Use sampling to profile concurrent nodes")
+                self.profiler = None
+        else:
+            self.sampler = StackSampler(threading.get_ident(), self.interval)
+            self.sampler.start()
+
+    def stop(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+        if self.sampler is not None:
+            self.sampler.stop()
+        self.wall_seconds = time.perf_counter() - self.started
+
+    def write(self, output_dir, node_name):
+        """
+        Write {node_name}.collapsed (sampling) or {node_name}.prof (deterministic, for snakeviz/pstats)
+        and a {node_name}.summary.txt with the top self-time functions into output_dir
+        """
+        if self.profiler is None and self.sampler is None:
+            return
+        output_dir.mkdir(parents=True, exist_ok=True)
+        header = f"node: {node_name}\nmode: {self.mode}\nwall seconds: {self.wall_seconds:.4f}\n\n"
+
+        if self.profiler is not None:
+            self.profiler.dump_stats(output_dir / f"{node_name}.prof")
+            stream = io.StringIO()
+            pstats.Stats(self.profiler, stream=stream).sort_stats("tottime").print_stats(self.top)
+            summary = stream.getvalue()
+        else:
+            (output_dir / f"{node_name}.collapsed").write_text(self.sampler.collapsed(), encoding="utf-8")
+            summary = self.sampler.summary(self.top)
+
+        (output_dir / f"{node_name}.summary.txt").write_text(header + summary, encoding="utf-8")
+
+
+def _finish(profile, node_name, state, result):
+    profile.stop()
+    # start_run opens the run, so its timestamp is only in the node's output
+    current_time = (result or {}).get("current_time") or (state or {}).get("current_time")
+    if not current_time:
+        logging.warning(f"No current_time in the state of {node_name}, its profile is not written")
+        return
+    try:
+        profile.write(PROJECT_ROOT / "model_outputs" / current_time / "profiles", node_name)
+    except Exception as e:
+        # Profiling must never fail the node it measures
+        logging.error(f"Could not write profile of {node_name}: {e}")
+
+
+def profiled(node, node_name, script_config):
+    """
+    Wrap a graph node (sync or async) in the profiler selected by PROFILING / MUSICOLOGY_PROFILE.
+    Its profile is written to model_outputs/{current_time}/profiles. With profiling off the node is returned
+    unchanged, so there is no overhead at all.
+
+    An async node is profiled on the event loop thread, so its profile also contains the nodes running
+    concurrently with it (e.g. the other voters).
+    """
+    mode = get_profiling_mode(script_config)
+    if mode is None:
+        return node
+
+    profiling_config = (script_config or {}).get("PROFILING", {})
+    interval = profiling_config.get("SAMPLE_INTERVAL_SECONDS", 0.005)
+    top = profiling_config.get("TOP_FUNCTIONS", 25)
+
+    if inspect.iscoroutinefunction(node):
+        @functools.wraps(node)
+        async def async_wrapper(state, *args, **kwargs):
+            profile = NodeProfile(mode, interval, top)
+            profile.start()
+            result = None
+            try:
+                result = await node(state, *args, **kwargs)
+                return result
+            finally:
+                _finish(profile, node_name, state, result)
+
+        return async_wrapper
+
+    @functools.wraps(node)
+    def wrapper(state, *args, **kwargs):
+        profile = NodeProfile(mode, interval, top)
+        profile.start()
+        result = None
+        try:
+            result = node(state, *args, **kwargs)
+            return result
+        finally:
+            _finish(profile, node_name, state, result)
+
+    return wrapper
@@ -13,6 +13,12 @@ Please make sure the songs really exist, for example:
 - Jubstin Timberbake - Mazy in Hove - is incorrect, because neither artist, nor the song exist
 """
 
+# Appended to the voters' message only, final_prompt (the response cache key and playlist naming input) stays as asked
+CANDIDATES_PROMPT = """
+Candidate songs found from partial criteria (keep only those matching all criteria, replace the rest):
+{CANDIDATES}
+"""
+
 
 VALIDATION_PROMPTS = {
     'genre': """You are a helpful input data validator for music genres. 
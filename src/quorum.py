@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import threading
+import time
+
+from src.resilience import CircuitOpenError
+
+# Voter statuses recorded in State.voter_status
+VOTED = "voted"
+CACHED = "cached"
+TIMED_OUT = "timeout"
+FAILED = "error"
+DROPPED = "dropped"  # Quorum reached or latency budget spent before the voter answered
+CIRCUIT_OPEN = "circuit_open"  # Provider skipped while its circuit breaker cools down
+
+PARTICIPATING_STATUSES = {VOTED, CACHED}
+
+
+class RunQuorum:
+    """
+    Tracks the voters of a single run. The vote closes once MIN_VOTERS ballots arrived
+    (plus GRACE_SECONDS for stragglers) or the LATENCY_BUDGET_SECONDS of the run is spent.
+    """
+
+    def __init__(self, min_voters, budget_seconds=None, grace_seconds=0):
+        self.min_voters = min_voters
+        self.budget_seconds = budget_seconds
+        self.grace_seconds = grace_seconds
+        self.started_at = time.monotonic()
+        self.arrived = set()
+        self.quorum_reached = asyncio.Event()
+
+    def record(self, voter):
+        self.arrived.add(voter)
+        if len(self.arrived) >= self.min_voters:
+            self.quorum_reached.set()
+
+    async def closed(self):
+        """Completes when the remaining voters should no longer be waited for"""
+        remaining = None
+        if self.budget_seconds is not None:
+            remaining = max(self.budget_seconds - (time.monotonic() - self.started_at), 0)
+
+        try:
+            await asyncio.wait_for(self.quorum_reached.wait(), timeout=remaining)
+        except asyncio.TimeoutError:
+            logging.warning(f"Latency budget of {self.budget_seconds}s spent with {len(self.arrived)} ballots")
+            return
+
+        if self.grace_seconds:
+            await asyncio.sleep(self.grace_seconds)
+
+
+_quorums = {}
+_quorums_lock = threading.Lock()
+
+
+def get_run_quorum(run_id, script_config):
+    """Quorum shared by the voter nodes of one run (None when QUORUM is disabled)"""
+    quorum_config = script_config.get("QUORUM", {})
+    if run_id is None or not quorum_config.get("ENABLED", False):
+        return None
+
+    with _quorums_lock:
+        if run_id not in _quorums:
+            _quorums[run_id] = RunQuorum(
+                min_voters=quorum_config.get("MIN_VOTERS") or len(script_config["PROVIDERS"]),
+                budget_seconds=quorum_config.get("LATENCY_BUDGET_SECONDS"),
+                grace_seconds=quorum_config.get("GRACE_SECONDS", 0)
+            )
+        return _quorums[run_id]
+
+
+def close_run_quorum(run_id):
+    with _quorums_lock:
+        _quorums.pop(run_id, None)
+
+
+async def vote(call, voter, run_quorum):
+    """
+    Await a voter's call unless the run's vote closes first.
+    Returns (status, response) - response is None when the voter does not take part.
+    """
+    call_task = asyncio.ensure_future(call)
+    waiters = {call_task}
+    if run_quorum is not None:
+        waiters.add(asyncio.ensure_future(run_quorum.closed()))
+
+    done, pending = await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+
+    if call_task not in done:
+        logging.warning(f"{voter} dropped, the vote closed before it answered")
+        return DROPPED, None
+
+    try:
+        response = call_task.result()
+    except asyncio.TimeoutError:
+        logging.warning(f"{voter} did not respond within its timeout, skipping its ballot")
+        return TIMED_OUT, None
+    except CircuitOpenError:
+        # Another call took the half-open trial between the circuit check and the request
+        logging.warning(f"Circuit of {voter} is open, skipping its ballot")
+        return CIRCUIT_OPEN, None
+    except Exception as e:
+        logging.error(f"{voter} failed, skipping its ballot: {e}")
+        return FAILED, None
+
+    if run_quorum is not None:
+        run_quorum.record(voter)
+    return VOTED, response
@@ -0,0 +1,320 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+# YouTube Data API quota resets at midnight Pacific Time
+QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+
+DEFAULT_RATE_LIMITS_PATH = Path(__file__).parent.parent / ".cache" / "rate_limits.sqlite"
+
+
+class QuotaExceededError(RuntimeError):
+    pass
+
+
+class TokenBucket:
+    """Thread-safe token bucket - acquire() blocks until enough tokens are available"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, tokens=1):
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class QuotaLimiter:
+    """
+    Per-second request limit plus a daily budget of quota units.
+    Requests over the per-second limit wait, requests over the daily budget raise QuotaExceededError.
+    With a daily_usage (SharedDailyQuota) the units used today are counted across processes and restarts,
+    otherwise only by this process.
+    """
+
+    def __init__(self, requests_per_second, daily_units=None, bucket=None, daily_usage=None):
+        self.bucket = bucket or TokenBucket(requests_per_second)
+        self.daily_units = daily_units
+        self.daily_usage = daily_usage
+        self.used_units = 0
+        self.quota_day = quota_day()
+        self.lock = threading.Lock()
+
+    def acquire(self, units=1):
+        if self.daily_units is not None:
+            if self.daily_usage is not None:
+                self.daily_usage.take(units, self.daily_units)
+            else:
+                with self.lock:
+                    today = quota_day()
+                    if today != self.quota_day:
+                        self.quota_day = today
+                        self.used_units = 0
+
+                    if self.used_units + units > self.daily_units:
+                        raise QuotaExceededError(
+                            f"Daily quota of {self.daily_units} units exhausted ({self.used_units} used)"
+                        )
+                    self.used_units += units
+
+        self.bucket.acquire()
+
+    @property
+    def remaining_units(self):
+        if self.daily_units is None:
+            return None
+        if self.daily_usage is not None:
+            return self.daily_units - self.daily_usage.used_units()
+        return self.daily_units - self.used_units
+
+
+def quota_day() -> str:
+    """Current quota day, e.g. '2026-10-17' - the Pacific date, as the YouTube quota resets at midnight PT"""
+    return datetime.now(QUOTA_TIMEZONE).date().isoformat()
+
+
+class SharedDailyQuota:
+    """
+    Units of a daily quota used per quota day, kept in SQLite next to the shared token buckets.
+    Every process on the host spends the same budget and a restart does not forget today's usage.
+    """
+
+    def __init__(self, name, path=DEFAULT_RATE_LIMITS_PATH):
+        self.name = name
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS daily_quotas ("
+                "name TEXT NOT NULL, day TEXT NOT NULL, used_units INTEGER NOT NULL, PRIMARY KEY (name, day))"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def take(self, units, daily_units):
+        """Count units against today's budget, raises QuotaExceededError (counting nothing) if they do not fit"""
+        day = quota_day()
+        conn = self._connect()
+        try:
+            # IMMEDIATE takes the write lock up front, so check-and-add is atomic across processes
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT used_units FROM daily_quotas WHERE name = ? AND day = ?",
+                               (self.name, day)).fetchone()
+            used = row[0] if row else 0
+            if used + units > daily_units:
+                conn.execute("ROLLBACK")
+                raise QuotaExceededError(f"Daily quota of {daily_units} units exhausted ({used} used on {day})")
+
+            conn.execute("INSERT OR REPLACE INTO daily_quotas (name, day, used_units) VALUES (?, ?, ?)",
+                         (self.name, day, used + units))
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def used_units(self) -> int:
+        with self._connect() as conn:
+            row = conn.execute("SELECT used_units FROM daily_quotas WHERE name = ? AND day = ?",
+                               (self.name, quota_day())).fetchone()
+        return row[0] if row else 0
+
+
+class SharedTokenBucket:
+    """
+    Token bucket whose state lives in SQLite, so all worker processes on the host draw from the same budget.
+    acquire() queues until enough tokens are available instead of failing, and usage settled after a call
+    may push the bucket below zero - later callers then wait for the overdraft to refill.
+    """
+
+    def __init__(self, name, rate, capacity=None, path=DEFAULT_RATE_LIMITS_PATH):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS token_buckets ("
+                "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute("INSERT OR IGNORE INTO token_buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                         (self.name, self.capacity, time.time()))
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _take(self, tokens):
+        """Take tokens (negative to return them) if available; returns the seconds to wait otherwise"""
+        conn = self._connect()
+        try:
+            # IMMEDIATE takes the write lock up front, so the read-refill-write below is atomic across processes
+            conn.execute("BEGIN IMMEDIATE")
+            available, updated_at = conn.execute(
+                "SELECT tokens, updated_at FROM token_buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+            now = time.time()
+            available = min(self.capacity, available + max(now - updated_at, 0) * self.rate)
+
+            wait = 0.0
+            if tokens > 0 and available < min(tokens, self.capacity):
+                # Requests larger than the bucket go through once it is full instead of waiting forever
+                wait = (min(tokens, self.capacity) - available) / self.rate
+            else:
+                available = min(self.capacity, available - tokens)
+
+            conn.execute("UPDATE token_buckets SET tokens = ?, updated_at = ? WHERE name = ?",
+                         (available, now, self.name))
+            conn.execute("COMMIT")
+            return wait
+        finally:
+            conn.close()
+
+    def acquire(self, tokens=1):
+        while (wait := self._take(tokens)) > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, tokens=1):
+        while (wait := await asyncio.to_thread(self._take, tokens)) > 0:
+            await asyncio.sleep(wait)
+
+    def settle(self, tokens):
+        """Charge (or refund, if negative) tokens after the fact without waiting"""
+        if tokens:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                available, updated_at = conn.execute(
+                    "SELECT tokens, updated_at FROM token_buckets WHERE name = ?", (self.name,)
+                ).fetchone()
+                now = time.time()
+                available = min(self.capacity, available + max(now - updated_at, 0) * self.rate - tokens)
+                conn.execute("UPDATE token_buckets SET tokens = ?, updated_at = ? WHERE name = ?",
+                             (available, now, self.name))
+                conn.execute("COMMIT")
+            finally:
+                conn.close()
+
+
+class ProviderRateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute budgets of one API provider (anthropic, openai, ...),
+    shared by every process and every call made to that provider - voters and helper models alike.
+    """
+
+    def __init__(self, name, rpm=None, tpm=None, path=DEFAULT_RATE_LIMITS_PATH):
+        self.name = name
+        self.requests = SharedTokenBucket(f"{name}:requests", rpm / 60, rpm, path) if rpm else None
+        self.tokens = SharedTokenBucket(f"{name}:tokens", tpm / 60, tpm, path) if tpm else None
+
+    def acquire(self, estimated_tokens=0):
+        started = time.monotonic()
+        if self.requests is not None:
+            self.requests.acquire()
+        if self.tokens is not None and estimated_tokens:
+            self.tokens.acquire(estimated_tokens)
+        self._log_wait(started)
+
+    async def aacquire(self, estimated_tokens=0):
+        started = time.monotonic()
+        if self.requests is not None:
+            await self.requests.aacquire()
+        if self.tokens is not None and estimated_tokens:
+            await self.tokens.aacquire(estimated_tokens)
+        self._log_wait(started)
+
+    def settle(self, estimated_tokens, used_tokens):
+        """Correct the TPM budget once the actual usage of a call is known"""
+        if self.tokens is not None and used_tokens is not None:
+            self.tokens.settle(used_tokens - estimated_tokens)
+
+    def _log_wait(self, started):
+        waited = time.monotonic() - started
+        if waited > 1:
+            logging.info(f"Waited {waited:.1f}s for the {self.name} rate limit")
+
+
+_provider_limiters = {}
+_provider_limiters_lock = threading.Lock()
+
+
+def get_provider_name(model: str) -> str:
+    """API provider of a "provider:model" string, e.g. openai for openai:gpt-4o-mini"""
+    return model.split(":", 1)[0]
+
+
+def get_provider_rate_limiter(model, script_config):
+    """
+    Process-wide limiter of the provider serving model, from RATE_LIMITS in config.json
+    (None when rate limiting is disabled or the provider has no budget).
+    """
+    if script_config is None:
+        return None
+    rate_limits = script_config.get("RATE_LIMITS", {})
+    if not rate_limits.get("ENABLED", False):
+        return None
+
+    name = get_provider_name(model)
+    budget = rate_limits.get("PROVIDERS", {}).get(name)
+    if not budget:
+        return None
+
+    with _provider_limiters_lock:
+        if name not in _provider_limiters:
+            _provider_limiters[name] = ProviderRateLimiter(
+                name,
+                rpm=budget.get("RPM"),
+                tpm=budget.get("TPM"),
+                path=rate_limits.get("PATH") or DEFAULT_RATE_LIMITS_PATH
+            )
+        return _provider_limiters[name]
+
+
+def get_shared_bucket(name, requests_per_second, script_config):
+    """Cross-process bucket for a per-second limit, None when RATE_LIMITS is disabled"""
+    rate_limits = script_config.get("RATE_LIMITS", {})
+    if not rate_limits.get("ENABLED", False):
+        return None
+    return SharedTokenBucket(f"{name}:requests", requests_per_second, requests_per_second,
+                             path=rate_limits.get("PATH") or DEFAULT_RATE_LIMITS_PATH)
+
+
+def get_shared_daily_quota(name, script_config):
+    """Cross-process usage of a daily quota, None when RATE_LIMITS is disabled"""
+    rate_limits = script_config.get("RATE_LIMITS", {})
+    if not rate_limits.get("ENABLED", False):
+        return None
+    return SharedDailyQuota(name, path=rate_limits.get("PATH") or DEFAULT_RATE_LIMITS_PATH)
+
+
+def estimate_tokens(messages, expected_output_tokens=0) -> int:
+    """Rough token count of a chat call (~4 characters per token) used to reserve TPM before it is made"""
+    return sum(len(str(message.content)) for message in messages) // 4 + expected_output_tokens
+
+
+def used_tokens(response):
+    """Total tokens reported by a chat model response, None if it does not report usage"""
+    usage = getattr(response, "usage_metadata", None)
+    return usage.get("total_tokens") if usage else None
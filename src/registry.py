@@ -0,0 +1,75 @@
+import asyncio
+import threading
+from collections.abc import Mapping
+
+from langchain.chat_models import init_chat_model
+
+from src.schemas import RecommendationResponse
+from src.tools import get_tools
+
+
+def get_provider_configs(script_config) -> list[dict]:
+    """Voter ensemble from the PROVIDERS list in config.json"""
+    return script_config["PROVIDERS"]
+
+
+def get_provider_config(script_config, name) -> dict:
+    for provider in get_provider_configs(script_config):
+        if provider["NAME"] == name:
+            return provider
+    raise KeyError(f"Provider '{name}' not found in PROVIDERS")
+
+
+class ModelRegistry(Mapping):
+    """
+    Chat models of the voters, bound to the search tools, and their structured-output runnables.
+    Each is built once per process, on first use, so importing the graph stays cheap
+    and no voter call pays for with_structured_output again.
+    Voters build through astructured, off the event loop, and every provider has its own lock,
+    so building one provider's model never stalls the other voters or concurrent runs.
+    """
+
+    def __init__(self, script_config):
+        self.script_config = script_config
+        self.providers = {provider["NAME"]: provider for provider in get_provider_configs(script_config)}
+        self._models = {}
+        self._structured = {}
+        self._locks = {name: threading.Lock() for name in self.providers}
+
+    def _build(self, name):
+        model = init_chat_model(model=self.providers[name]["MODEL"], temperature=self.script_config["TEMPERATURE"])
+        return model.bind_tools(get_tools(), tool_choice="web_search")
+
+    def __getitem__(self, name):
+        if name not in self.providers:
+            raise KeyError(name)
+        with self._locks[name]:
+            if name not in self._models:
+                self._models[name] = self._build(name)
+            return self._models[name]
+
+    def structured(self, name):
+        """Runnable returning {raw, parsed: RecommendationResponse}, using the provider's METHOD (e.g. function_calling)"""
+        model = self[name]
+        with self._locks[name]:
+            if name not in self._structured:
+                method = self.providers[name].get("METHOD")
+                # include_raw keeps the AIMessage next to the parsed response, for its token usage
+                if method:
+                    self._structured[name] = model.with_structured_output(RecommendationResponse, method=method,
+                                                                          include_raw=True)
+                else:
+                    self._structured[name] = model.with_structured_output(RecommendationResponse, include_raw=True)
+            return self._structured[name]
+
+    async def astructured(self, name):
+        """structured(name) for coroutines, init_chat_model and bind_tools block, so a first build runs in a thread"""
+        if name in self._structured:
+            return self._structured[name]
+        return await asyncio.to_thread(self.structured, name)
+
+    def __iter__(self):
+        return iter(self.providers)
+
+    def __len__(self):
+        return len(self.providers)
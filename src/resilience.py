@@ -0,0 +1,226 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class LatencyTracker:
+    """Latencies of the last `window` successful calls to a provider"""
+
+    def __init__(self, window=50):
+        self.samples = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, q=0.95, min_samples=1):
+        """q-th percentile of the window, None until min_samples calls were observed"""
+        with self.lock:
+            samples = sorted(self.samples)
+        if len(samples) < max(min_samples, 1):
+            return None
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for `cooldown_seconds`.
+    Afterwards a single trial call is let through - its success closes the circuit, its failure reopens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=3, cooldown_seconds=300):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown_seconds:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def would_allow(self) -> bool:
+        """allow() without taking the half-open trial, for deciding whether to try a call at all"""
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                return time.monotonic() - self.opened_at >= self.cooldown_seconds
+            return not self.trial_in_flight
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logging.warning(f"Circuit opened after {self.failures} consecutive failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def abandon(self):
+        """The call was cancelled by the caller, which tells nothing about the provider"""
+        with self.lock:
+            self.trial_in_flight = False
+
+
+class ProviderHealth:
+    """
+    Latency tracking, adaptive timeout, hedging and circuit breaker of one provider.
+    The timeout of a call is MULTIPLIER x the observed p95, kept between MIN_SECONDS and the provider's
+    configured TIMEOUT. With hedging, a duplicate request is sent once a call runs past the p95
+    and whichever answers first wins.
+    """
+
+    def __init__(self, name, resilience_config=None):
+        resilience_config = resilience_config or {}
+        self.name = name
+        self.timeout_config = resilience_config.get("ADAPTIVE_TIMEOUT", {})
+        self.hedging_config = resilience_config.get("HEDGING", {})
+        breaker_config = resilience_config.get("CIRCUIT_BREAKER", {})
+
+        self.latencies = LatencyTracker(self.timeout_config.get("WINDOW", 50))
+        self.breaker = None
+        if breaker_config.get("ENABLED", False):
+            self.breaker = CircuitBreaker(breaker_config.get("FAILURE_THRESHOLD", 3),
+                                          breaker_config.get("COOLDOWN_SECONDS", 300))
+
+    def p95(self):
+        return self.latencies.percentile(0.95, self.timeout_config.get("MIN_SAMPLES", 5))
+
+    def timeout(self, max_timeout=None):
+        p95 = self.p95()
+        if not self.timeout_config.get("ENABLED", False) or p95 is None:
+            return max_timeout
+
+        timeout = max(p95 * self.timeout_config.get("MULTIPLIER", 2.0), self.timeout_config.get("MIN_SECONDS", 0))
+        return min(timeout, max_timeout) if max_timeout else timeout
+
+    def hedge_delay(self):
+        if not self.hedging_config.get("ENABLED", False):
+            return None
+        return self.p95()
+
+    def allow(self) -> bool:
+        """
+        Whether the circuit lets a call through. Does not take the half-open trial: acall/track take it
+        right before the request, so nothing that fails or is cancelled in between can leak it.
+        """
+        if self.breaker is None or self.breaker.would_allow():
+            return True
+        logging.warning(f"Circuit of {self.name} is open, skipping the call")
+        return False
+
+    def _enter(self):
+        """Take the breaker's slot for a call (the trial when half-open), CircuitOpenError when there is none"""
+        if self.breaker is not None and not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit of {self.name} is open")
+
+    def _record_success(self, started):
+        self.latencies.record(time.monotonic() - started)
+        if self.breaker is not None:
+            self.breaker.record_success()
+
+    def _record_failure(self, timeout=None):
+        if timeout:
+            # A timed out call took at least `timeout`, recording it stops adaptive timeouts from shrinking
+            self.latencies.record(timeout)
+        if self.breaker is not None:
+            self.breaker.record_failure()
+
+    async def acall(self, factory, max_timeout=None, hedge=None):
+        """
+        Await factory() under the adaptive timeout. hedge (defaults to factory) creates the duplicate request.
+        Raises asyncio.TimeoutError when the timeout passes.
+        """
+        timeout = self.timeout(max_timeout)
+        self._enter()
+        started = time.monotonic()
+        try:
+            response = await asyncio.wait_for(self._hedged(factory, hedge or factory), timeout=timeout)
+        except asyncio.CancelledError:
+            if self.breaker is not None:
+                self.breaker.abandon()
+            raise
+        except asyncio.TimeoutError:
+            self._record_failure(timeout)
+            raise
+        except Exception:
+            self._record_failure()
+            raise
+
+        self._record_success(started)
+        return response
+
+    async def _hedged(self, factory, hedge):
+        tasks = {asyncio.ensure_future(factory())}
+        try:
+            delay = self.hedge_delay()
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return done.pop().result()
+
+            logging.info(f"{self.name} call passed its p95 of {delay:.1f}s, sending a hedged request")
+            tasks.add(asyncio.ensure_future(hedge()))
+            errors = []
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    errors.append(task.exception())
+            raise errors[0]
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def track(self, fn):
+        """Run fn in the calling thread, only recording its latency and outcome (its transport enforces the timeout)"""
+        self._enter()
+        started = time.monotonic()
+        try:
+            response = fn()
+        except Exception:
+            self._record_failure()
+            raise
+
+        self._record_success(started)
+        return response
+
+
+_health = {}
+_health_lock = threading.Lock()
+
+
+def get_provider_health(name, script_config) -> ProviderHealth:
+    """Process-wide health of a provider (voter NAME or "youtube"), configured by RESILIENCE in config.json"""
+    with _health_lock:
+        if name not in _health:
+            _health[name] = ProviderHealth(name, script_config.get("RESILIENCE", {}))
+        return _health[name]
@@ -0,0 +1,191 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from src.entity_resolution import song_key
+
+DEFAULT_RUN_STORE_PATH = Path(__file__).parent.parent / "model_outputs" / "runs.sqlite"
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS runs ("
+    "run_id TEXT PRIMARY KEY, run_timestamp TEXT NOT NULL, created_at REAL NOT NULL, replay_of TEXT, "
+    "user_question TEXT, prompt_attributes TEXT, playlist_name TEXT, playlist_id TEXT, "
+    "participants TEXT, voter_status TEXT, metrics TEXT)",
+    "CREATE TABLE IF NOT EXISTS ballots ("
+    "run_id TEXT NOT NULL, provider TEXT NOT NULL, position INTEGER NOT NULL, rank INTEGER, "
+    "song_title TEXT, artist TEXT, album TEXT, year INTEGER, reason TEXT, song_key TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS recommendations ("
+    "run_id TEXT NOT NULL, position INTEGER NOT NULL, song_title TEXT, artist TEXT, album TEXT, year INTEGER, "
+    "total_points REAL, votes INTEGER, voters TEXT, song_key TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS runs_run_timestamp ON runs (run_timestamp)",
+    "CREATE INDEX IF NOT EXISTS runs_created_at ON runs (created_at)",
+    "CREATE INDEX IF NOT EXISTS ballots_run ON ballots (run_id, provider)",
+    "CREATE INDEX IF NOT EXISTS ballots_provider ON ballots (provider, run_id)",
+    "CREATE INDEX IF NOT EXISTS ballots_song ON ballots (song_key)",
+    "CREATE INDEX IF NOT EXISTS recommendations_run ON recommendations (run_id, position)",
+    "CREATE INDEX IF NOT EXISTS recommendations_song ON recommendations (song_key)",
+]
+
+SONG_FIELDS = ["song_title", "artist", "album", "year"]
+
+
+class RunStore:
+    """
+    Append-only SQLite store of every run: its context, each voter's ballot and the final ranking.
+    Ballots and recommendations are indexed by run, provider and canonical song key (see entity_resolution.song_key),
+    so queries over months of runs read a few index pages instead of thousands of JSON/CSV files.
+    A run is written in one transaction once it is finished.
+    """
+
+    def __init__(self, path=DEFAULT_RUN_STORE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            for statement in SCHEMA:
+                conn.execute(statement)
+
+    def _connect(self):
+        # New connection per operation keeps the store usable from threads and separate processes
+        return sqlite3.connect(self.path, timeout=30)
+
+    def write_run(self, run_id, current_time, ballots, recommendations, voter_status=None, participants=None,
+                  user_question=None, prompt_attributes=None, playlist_name=None, playlist_id=None,
+                  metrics=None, replay_of=None):
+        """
+        Insert a finished run. ballots: {provider: RecommendationResponse dict},
+        recommendations: the ranked DataFrame of aggregate_ballots.
+        current_time is stored as run_timestamp, CURRENT_TIME is an SQL keyword.
+        """
+        ballot_rows = []
+        for provider, ballot in ballots.items():
+            for position, recommendation in enumerate(
+                    sorted(ballot.get("recommendations", []), key=lambda r: r["rank"], reverse=True)):
+                ballot_rows.append((
+                    run_id, provider, position, recommendation["rank"],
+                    *(recommendation.get(field) for field in SONG_FIELDS), recommendation.get("reason"),
+                    song_key(recommendation["song_title"], recommendation["artist"])
+                ))
+
+        recommendation_rows = [
+            (run_id, position, row.song_title, row.artist, row.album, int(row.year), float(row.total_points),
+             int(row.votes), row.voters, song_key(row.song_title, row.artist))
+            for position, row in enumerate(recommendations.itertuples(index=False))
+        ]
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO runs (run_id, run_timestamp, created_at, replay_of, user_question, prompt_attributes, "
+                "playlist_name, playlist_id, participants, voter_status, metrics) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, current_time, time.time(), replay_of, user_question, _dumps(prompt_attributes),
+                 playlist_name, playlist_id, _dumps(participants), _dumps(voter_status), _dumps(metrics))
+            )
+            conn.executemany("INSERT INTO ballots VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", ballot_rows)
+            conn.executemany("INSERT INTO recommendations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             recommendation_rows)
+
+    def runs(self, since=None, until=None, include_replays=False) -> list[dict]:
+        """Runs with since <= run_timestamp <= until (run timestamps, e.g. '2026_10_01'), oldest first"""
+        conditions, params = _time_range("run_timestamp", since, until)
+        if not include_replays:
+            conditions.append("replay_of IS NULL")
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(f"SELECT * FROM runs{where} ORDER BY run_timestamp", params).fetchall()
+
+        json_columns = ("prompt_attributes", "participants", "voter_status", "metrics")
+        return [{key: json.loads(row[key]) if key in json_columns and row[key] else row[key] for key in row.keys()}
+                for row in rows]
+
+    def load_ballots(self, run_id) -> dict:
+        """{provider: RecommendationResponse dict} of a run, e.g. to replay it"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT provider, rank, song_title, artist, album, year, reason FROM ballots "
+                "WHERE run_id = ? ORDER BY provider, position", (run_id,)
+            ).fetchall()
+            voter_status = conn.execute("SELECT voter_status FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+
+        # Voters that answered with an empty ballot have no rows, they are kept from voter_status
+        ballots = {provider: {"recommendations": []}
+                   for provider in json.loads(voter_status[0] or "{}")} if voter_status else {}
+        for provider, rank, song_title, artist, album, year, reason in rows:
+            ballots.setdefault(provider, {"recommendations": []})["recommendations"].append({
+                "rank": rank, "song_title": song_title, "artist": artist, "album": album, "year": year,
+                "reason": reason
+            })
+        return ballots
+
+    def ballots(self, since=None, until=None, provider=None):
+        """DataFrame of all ballot rows of the runs in [since, until], optionally of one provider"""
+        import pandas as pd
+
+        conditions, params = _time_range("runs.run_timestamp", since, until)
+        if provider is not None:
+            conditions.append("ballots.provider = ?")
+            params.append(provider)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with self._connect() as conn:
+            return pd.read_sql_query(
+                f"SELECT runs.run_timestamp, ballots.* FROM ballots JOIN runs USING (run_id){where} "
+                "ORDER BY runs.run_timestamp, ballots.provider, ballots.position", conn, params=params
+            )
+
+    def song_history(self, song_title, artist):
+        """DataFrame of every final ranking the song made it into, oldest first"""
+        import pandas as pd
+
+        with self._connect() as conn:
+            return pd.read_sql_query(
+                "SELECT runs.run_timestamp, recommendations.* FROM recommendations JOIN runs USING (run_id) "
+                "WHERE recommendations.song_key = ? ORDER BY runs.run_timestamp", conn,
+                params=[song_key(song_title, artist)]
+            )
+
+
+def _dumps(value):
+    return None if value is None else json.dumps(value, ensure_ascii=False)
+
+
+def _time_range(column, since, until):
+    conditions, params = [], []
+    if since is not None:
+        conditions.append(f"{column} >= ?")
+        params.append(since)
+    if until is not None:
+        # Prefixes like '2026_10' include the whole month
+        conditions.append(f"{column} <= ?")
+        params.append(f"{until}\uffff")
+    return conditions, params
+
+
+_run_stores = {}
+_run_stores_lock = threading.Lock()
+
+
+def get_run_store(script_config):
+    """Process-wide RunStore configured by RUN_STORE in config.json (None if disabled)"""
+    store_config = (script_config or {}).get("RUN_STORE", {})
+    if not store_config.get("ENABLED", False):
+        return None
+
+    path = store_config.get("PATH") or DEFAULT_RUN_STORE_PATH
+    with _run_stores_lock:
+        if path not in _run_stores:
+            logging.info(f"Using run store at {path}")
+            _run_stores[path] = RunStore(path)
+        return _run_stores[path]
+
+
+def writes_run_artifacts(script_config) -> bool:
+    """Whether runs still write the per-run JSON/CSV files, always when the run store is disabled"""
+    store_config = (script_config or {}).get("RUN_STORE", {})
+    return not store_config.get("ENABLED", False) or store_config.get("RUN_ARTIFACTS", False)
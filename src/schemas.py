@@ -22,6 +22,11 @@ class RecommendationResponse(BaseModel):
     )
 
 
+def merge_responses(left: Dict | None, right: Dict | None) -> Dict:
+    """Reducer collecting per-voter values of voter nodes running in parallel"""
+    return {**(left or {}), **(right or {})}
+
+
 class State(TypedDict):
     # LangGraph reducer field
     messages: Annotated[List, add_messages]
@@ -29,12 +34,27 @@ class State(TypedDict):
     # Core inputs / outputs
     user_question: NotRequired[str]
     final_prompt: NotRequired[str]
+    speculative_candidates: NotRequired[List[dict]]  # SPECULATIVE_PREFETCH songs for the voters, not in final_prompt
     final_answer: NotRequired[str]
+    current_time: NotRequired[str]  # Run timestamp, names the model_outputs folder
+
+    # Model responses - voter name from PROVIDERS -> RecommendationResponse dict
+    responses: Annotated[Dict[str, dict], merge_responses]
+    voter_status: Annotated[Dict[str, str], merge_responses]  # voted / cached / timeout / error / dropped / circuit_open
+
+    # Run context
+    run_id: NotRequired[str]
+    replay_of: NotRequired[str]  # run_id of the stored run a replay was made from
+
+    # Results
+    final_recommendations: NotRequired[dict]
+    participants: NotRequired[List[str]]
+    playlist_name: NotRequired[str]
+    playlist_id: NotRequired[str]
+    run_metrics: NotRequired[dict]  # Per-stage wall time, tokens and cost of the run (TELEMETRY)
 
-    # Model responses
-    anthropic_response: NotRequired[str]
-    openai_response: NotRequired[str]
-    google_genai_response: NotRequired[str] #TODO: See if it's fixed now
+    # YouTube
+    sync_playlist_id: NotRequired[str]  # Existing playlist to refresh instead of creating a new one
 
     # Prompt-building state
     prompt_attributes: NotRequired[Dict[str, str]]
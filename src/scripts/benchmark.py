@@ -0,0 +1,522 @@
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+RESULTS_PATH = PROJECT_ROOT / "model_outputs" / "benchmarks" / "results.jsonl"
+
+PROMPT_ATTRIBUTES = {
+    "genre": "synthwave",
+    "language": "any",
+    "year": "1980-1990",
+    "favorite_artists": "The Midnight, Kavinsky",
+    "hints": "night drive",
+    "mode": "find_new_artists"
+}
+
+# Words of the song titles of the fake ballots, different enough that entity resolution never merges two of them
+TITLE_WORDS = [
+    "Amber", "Boulevard", "Chrome", "Daybreak", "Echoes", "Fever", "Gravity", "Horizon", "Island", "Jupiter",
+    "Kaleidoscope", "Lagoon", "Monsoon", "Nocturne", "Oasis", "Prism", "Quasar", "Riptide", "Satellite", "Tundra",
+    "Utopia", "Velvet", "Wildfire", "Zenith"
+]
+
+
+def _sample_latency(rng, latency, jitter):
+    return max(0.0, rng.gauss(latency, jitter))
+
+
+def benchmark_title(song) -> str:
+    """
+    Distinct title of song number song of the pool, one word for the first len(TITLE_WORDS) songs.
+    Pools of up to 130 songs (NO_OF_SONGS 65) keep every title apart under entity resolution.
+    """
+    words = [TITLE_WORDS[song % len(TITLE_WORDS)]]
+    while song >= len(TITLE_WORDS):
+        song = song // len(TITLE_WORDS) - 1
+        words.append(TITLE_WORDS[song % len(TITLE_WORDS)])
+    return " ".join(words)
+
+
+# Fake chat models
+
+class FakeChatModel:
+    """
+    Stand-in for a langchain chat model: answers after latency +- jitter seconds (gaussian) and reports
+    token usage like the real providers. Voters get a RecommendationResponse drawn from a shared song pool,
+    so the ballots overlap and the aggregation has real votes to merge.
+    """
+
+    def __init__(self, name, latency=1.0, jitter=0.2, no_of_songs=10, spotify_lookups=0, content="Night Drive"):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.no_of_songs = no_of_songs
+        self.spotify_lookups = spotify_lookups
+        self.content = content
+        self.rng = random.Random(name)
+        self.lock = threading.Lock()
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def with_structured_output(self, schema, method=None, include_raw=False):
+        return FakeStructuredModel(self, schema, include_raw)
+
+    def _latency(self):
+        with self.lock:
+            return _sample_latency(self.rng, self.latency, self.jitter)
+
+    def _message(self, messages, content=None):
+        from langchain_core.messages import AIMessage
+
+        input_tokens = sum(len(str(message.content)) for message in messages) // 4
+        output_tokens = len(content or self.content) // 4
+        return AIMessage(content=content or self.content, usage_metadata={
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens
+        })
+
+    def recommendations(self, messages):
+        """Ballot of no_of_songs songs out of a pool of 2 * no_of_songs, seeded by voter and prompt"""
+        from src.tools import spotify_search
+
+        prompt = str(messages[-1].content)
+        for _ in range(self.spotify_lookups):
+            spotify_search(prompt[:100])
+
+        seed = hashlib.sha256(f"{self.name}|{prompt}".encode()).hexdigest()
+        songs = random.Random(seed).sample(range(2 * self.no_of_songs), self.no_of_songs)
+        return [
+            {
+                "rank": self.no_of_songs - position,
+                "song_title": benchmark_title(song),
+                "artist": f"Benchmark Artist {song % 7}",
+                "album": f"Benchmark Album {song % 5}",
+                "year": 1980 + song % 10,
+                "reason": "Offline benchmark ballot"
+            }
+            for position, song in enumerate(songs)
+        ]
+
+    def invoke(self, messages, *args, **kwargs):
+        time.sleep(self._latency())
+        return self._message(messages)
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        await asyncio.sleep(self._latency())
+        return self._message(messages)
+
+
+class FakeStructuredModel:
+    """with_structured_output() of a FakeChatModel, include_raw=True returns {raw, parsed, parsing_error}"""
+
+    def __init__(self, model, schema, include_raw=False):
+        self.model = model
+        self.schema = schema
+        self.include_raw = include_raw
+
+    def _output(self, messages):
+        parsed = self.schema(recommendations=self.model.recommendations(messages))
+        if not self.include_raw:
+            return parsed
+        raw = self.model._message(messages, parsed.model_dump_json())
+        return {"raw": raw, "parsed": parsed, "parsing_error": None}
+
+    def invoke(self, messages, *args, **kwargs):
+        time.sleep(self.model._latency())
+        return self._output(messages)
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        await asyncio.sleep(self.model._latency())
+        # spotify_search blocks, keep it off the event loop like a real tool call
+        return await asyncio.to_thread(self._output, messages)
+
+
+# Fake YouTube service
+
+class FakeRequest:
+    def __init__(self, service, handler):
+        self.service = service
+        self.handler = handler
+
+    def execute(self):
+        time.sleep(self.service.latency())
+        return self.handler()
+
+
+class FakeBatch:
+    """
+    new_batch_http_request(): one round trip for all added requests, results delivered to the callback.
+    Like the real endpoint it runs the requests in no particular order.
+    """
+
+    def __init__(self, service, callback=None):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self.requests.append((request, callback or self.callback, request_id or str(len(self.requests))))
+
+    def execute(self):
+        time.sleep(self.service.latency())
+        with self.service.lock:
+            requests = self.service.rng.sample(self.requests, len(self.requests))
+        for request, callback, request_id in requests:
+            response = request.handler()
+            if callback is not None:
+                callback(request_id, response, None)
+
+
+class FakeResource:
+    def __init__(self, **methods):
+        self.__dict__.update(methods)
+
+
+class FakeYouTubeService:
+    """
+    In-memory stand-in for the resources of the YouTube v3 service used by YouTubePlaylistCreator:
+    search().list, playlists().insert, playlistItems().list/insert/update/delete and batch requests.
+    Every videoId is derived from the search query, so repeated runs resolve the same songs to the same videos.
+    """
+
+    def __init__(self, latency=0.1, jitter=0.02):
+        self.request_latency = latency
+        self.jitter = jitter
+        self.rng = random.Random("youtube")
+        self.playlist_items = defaultdict(list)  # playlist id -> [(item id, video id)]
+        self.lock = threading.Lock()
+
+    def latency(self):
+        with self.lock:
+            return _sample_latency(self.rng, self.request_latency, self.jitter)
+
+    def _search(self, q, **kwargs):
+        video_id = hashlib.sha1(q.encode()).hexdigest()[:11]
+        return {"items": [{"id": {"videoId": video_id}, "snippet": {"title": q}}]}
+
+    def _insert_playlist(self, body, **kwargs):
+        playlist_id = f"PL{uuid.uuid4().hex[:16]}"
+        with self.lock:
+            self.playlist_items[playlist_id] = []
+        return {"id": playlist_id, "snippet": body["snippet"]}
+
+    def _insert_item(self, body, **kwargs):
+        snippet = body["snippet"]
+        item_id = uuid.uuid4().hex
+        with self.lock:
+            items = self.playlist_items[snippet["playlistId"]]
+            position = snippet.get("position", len(items))
+            items.insert(position, (item_id, snippet["resourceId"]["videoId"]))
+        return {"id": item_id, "snippet": snippet}
+
+    def _update_item(self, body, **kwargs):
+        snippet = body["snippet"]
+        with self.lock:
+            items = self.playlist_items[snippet["playlistId"]]
+            items[:] = [item for item in items if item[0] != body["id"]]
+            items.insert(snippet["position"], (body["id"], snippet["resourceId"]["videoId"]))
+        return body
+
+    def _delete_item(self, id, **kwargs):
+        with self.lock:
+            for items in self.playlist_items.values():
+                items[:] = [item for item in items if item[0] != id]
+        return {}
+
+    def _list_items(self, playlistId, maxResults=50, pageToken=None, **kwargs):
+        start = int(pageToken or 0)
+        with self.lock:
+            items = self.playlist_items[playlistId][start:start + maxResults]
+            has_more = start + maxResults < len(self.playlist_items[playlistId])
+        response = {"items": [{"id": item_id, "snippet": {"resourceId": {"videoId": video_id}}}
+                              for item_id, video_id in items]}
+        if has_more:
+            response["nextPageToken"] = str(start + maxResults)
+        return response
+
+    def _request(self, handler):
+        return lambda **kwargs: FakeRequest(self, lambda: handler(**kwargs))
+
+    def search(self):
+        return FakeResource(list=self._request(self._search))
+
+    def playlists(self):
+        return FakeResource(insert=self._request(self._insert_playlist))
+
+    def playlistItems(self):
+        return FakeResource(insert=self._request(self._insert_item), update=self._request(self._update_item),
+                            delete=self._request(self._delete_item), list=self._request(self._list_items))
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
+
+
+# Fake Spotify client
+
+class FakeSpotify:
+    """spotipy.Spotify stand-in for tools.spotify_search"""
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+
+    def search(self, q, limit=5, type='track,artist'):
+        time.sleep(self.latency)
+        tracks = [{"name": f"{q} {index}", "artists": [{"name": f"Benchmark Artist {index}"}],
+                   "album": {"name": f"Benchmark Album {index}"}} for index in range(limit)]
+        artists = [{"name": f"Benchmark Artist {index}", "genres": ["synthwave"]} for index in range(limit)]
+        return {"tracks": {"items": tracks}, "artists": {"items": artists}}
+
+
+# Harness
+
+def percentile(values, q):
+    """Nearest-rank percentile, None for no values"""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def latency_summary(values) -> dict:
+    return {
+        "p50": percentile(values, 0.50),
+        "p90": percentile(values, 0.90),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "mean": sum(values) / len(values) if values else None,
+        "max": max(values, default=None)
+    }
+
+
+def git_commit():
+    """(short commit hash, whether the tree has uncommitted changes), (None, None) outside a git checkout"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=PROJECT_ROOT,
+                                capture_output=True, text=True, check=True).stdout
+        return commit, bool(status.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def configure(config, args):
+    """
+    Point the graph's CONFIG at the stand-ins: no caches (unless --caches), no shared rate limits or daily
+    YouTube quota, runs and telemetry stored under model_outputs/benchmarks (telemetry gives the per-stage breakdown)
+    """
+    config["RESPONSE_CACHE"]["ENABLED"] = args.caches
+    config["VIDEO_CACHE"]["ENABLED"] = args.caches
+    config["RATE_LIMITS"]["ENABLED"] = False
+    config["SPECULATIVE_PREFETCH"]["ENABLED"] = False
+    config["YOUTUBE"]["DAILY_QUOTA_UNITS"] = None
+    config["RUN_STORE"] = {**config.get("RUN_STORE", {}), "PATH": "model_outputs/benchmarks/runs.sqlite"}
+    config["TELEMETRY"] = {
+        **config.get("TELEMETRY", {}),
+        "ENABLED": True,
+        "JSONL_PATH": "model_outputs/benchmarks/telemetry/events.jsonl",
+        "PROMETHEUS_PATH": "model_outputs/benchmarks/telemetry/metrics.prom"
+    }
+
+
+def install_fakes(recommendation, args):
+    """Swap the providers, the helper model, YouTube and Spotify for the stand-ins, returns the fake YouTube"""
+    import src.tools
+    import src.utils
+    import src.youtube_integration
+
+    config = recommendation.CONFIG
+    recommendation.MODELS._build = lambda name: FakeChatModel(
+        name, args.latency, args.jitter, config["NO_OF_SONGS"], args.spotify_lookups
+    )
+    helper_model = FakeChatModel("helper", args.helper_latency, args.jitter / 4)
+    src.utils.get_chat_model = lambda model="openai:gpt-4o-mini": helper_model
+
+    youtube = FakeYouTubeService(args.youtube_latency, args.youtube_latency / 5)
+    src.youtube_integration.get_youtube_credentials = lambda *args_, **kwargs: None
+    src.youtube_integration.get_youtube_service = lambda *args_, **kwargs: youtube
+
+    src.tools._spotify_client = FakeSpotify(args.spotify_latency)
+    return youtube
+
+
+async def run_once(app, index):
+    """One run of the graph from start_run, the prompt_builder step is recorded as already answered"""
+    from prompt_builder import build_final_prompt
+
+    thread = {"configurable": {"thread_id": f"benchmark-{index}-{uuid.uuid4().hex}"}}
+    await app.aupdate_state(thread, {
+        "final_prompt": build_final_prompt(PROMPT_ATTRIBUTES),
+        "prompt_attributes": dict(PROMPT_ATTRIBUTES)
+    }, as_node="prompt_builder")
+
+    started = time.perf_counter()
+    result = await app.ainvoke(None, thread)
+    return time.perf_counter() - started, result
+
+
+async def run_benchmark(app, runs, concurrency):
+    """runs graph runs, at most concurrency at a time. Returns (wall seconds, [(latency, result or error)])"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(index):
+        async with semaphore:
+            try:
+                return await run_once(app, index)
+            except Exception as e:
+                logging.error(f"Benchmark run {index} failed: {e}")
+                return None, e
+
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(*(limited(index) for index in range(runs)))
+    return time.perf_counter() - started, outcomes
+
+
+def stage_breakdown(results) -> dict:
+    """Per-stage wall time percentiles over the runs, from the run_metrics of each run"""
+    stage_seconds = defaultdict(list)
+    for result in results:
+        for stage, totals in result.get("run_metrics", {}).get("stages", {}).items():
+            stage_seconds[stage].append(totals["wall_seconds"])
+    return {stage: latency_summary(seconds) for stage, seconds in sorted(stage_seconds.items())}
+
+
+def playlist_sizes(results, youtube) -> list[dict]:
+    """Songs in the final ranking and videos in the playlist of every run"""
+    return [
+        {
+            "unique_songs": len(result["final_recommendations"]["song_title"]),
+            "playlist_size": len(youtube.playlist_items.get(result.get("playlist_id"), []))
+        }
+        for result in results
+    ]
+
+
+def previous_result(params):
+    """Last stored result measured with the same parameters"""
+    if not RESULTS_PATH.exists():
+        return None
+    previous = None
+    with open(RESULTS_PATH, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if record["params"] == params:
+                previous = record
+    return previous
+
+
+def print_report(record, previous):
+    def delta(key, value, unit):
+        if previous is None or previous["end_to_end"].get(key) is None or value is None:
+            return ""
+        change = value - previous["end_to_end"][key]
+        return f"  ({change:+.3f}{unit} vs {previous['commit']})"
+
+    print("=" * 60)
+    print(f"Benchmark of {record['params']['runs']} runs, {record['params']['concurrency']} concurrent "
+          f"(commit {record['commit']}{', dirty' if record['dirty'] else ''})")
+    print("=" * 60)
+    for key in ("p50", "p90", "p95", "p99", "max"):
+        value = record["end_to_end"][key]
+        if value is not None:
+            print(f"  {key:>4}: {value:8.3f}s{delta(key, value, 's')}")
+
+    throughput = record["throughput_runs_per_second"]
+    previous_throughput = previous and previous["throughput_runs_per_second"]
+    change = f"  ({throughput - previous_throughput:+.3f} vs {previous['commit']})" if previous_throughput else ""
+    print(f"  throughput: {throughput:.3f} runs/s{change}")
+    print(f"  errors: {record['errors']}")
+
+    for key, label in (("unique_songs", "unique songs"), ("playlist_size", "playlist size")):
+        values = [run[key] for run in record["runs"]]
+        if values:
+            print(f"  {label}: min {min(values)}  p50 {percentile(values, 0.50)}  max {max(values)}")
+
+    print("\nPer stage (wall seconds per run):")
+    for stage, summary in record["stages"].items():
+        print(f"  {stage:<32} p50 {summary['p50']:7.3f}s  p95 {summary['p95']:7.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the recommendation graph offline against fake providers")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=1.0, help="Mean voter latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.3, help="Standard deviation of the voter latency")
+    parser.add_argument("--helper-latency", type=float, default=0.3, help="Playlist naming model latency")
+    parser.add_argument("--youtube-latency", type=float, default=0.1, help="Latency of every YouTube request")
+    parser.add_argument("--spotify-latency", type=float, default=0.05)
+    parser.add_argument("--spotify-lookups", type=int, default=0, help="spotify_search calls per ballot")
+    parser.add_argument("--caches", action="store_true", help="Keep RESPONSE_CACHE and VIDEO_CACHE enabled")
+    parser.add_argument("--label", default=None, help="Free text stored with the result")
+    parser.add_argument("--no-save", action="store_true", help="Do not append the result to results.jsonl")
+    args = parser.parse_args()
+
+    # analyze_responses writes its artifacts relative to the working directory
+    os.chdir(PROJECT_ROOT)
+    sys.path.insert(0, str(PROJECT_ROOT))
+    for apikey in ['OPENAI_API_KEY', 'ANTHROPIC_API_KEY', 'GOOGLE_API_KEY', 'SPOTIPY_CLIENT_ID',
+                   'SPOTIPY_CLIENT_SECRET']:
+        os.environ.setdefault(apikey, "benchmark")
+
+    import recommendation
+    from langgraph.checkpoint.memory import MemorySaver
+
+    logging.getLogger().setLevel(logging.WARNING)
+    configure(recommendation.CONFIG, args)
+    youtube = install_fakes(recommendation, args)
+    # The real graph, with a checkpointer so every run can start after the interactive prompt_builder
+    app = recommendation.graph.compile(checkpointer=MemorySaver())
+
+    # Playlist resolution prints every searched song
+    with contextlib.redirect_stdout(io.StringIO()):
+        wall_seconds, outcomes = asyncio.run(run_benchmark(app, args.runs, args.concurrency))
+
+    latencies = [latency for latency, result in outcomes if latency is not None]
+    results = [result for latency, result in outcomes if latency is not None]
+    commit, dirty = git_commit()
+    params = {key: value for key, value in vars(args).items() if key not in ("label", "no_save")}
+    record = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "dirty": dirty,
+        "label": args.label,
+        "params": params,
+        "end_to_end": latency_summary(latencies),
+        "throughput_runs_per_second": len(results) / wall_seconds if wall_seconds else 0.0,
+        "errors": len(outcomes) - len(results),
+        "stages": stage_breakdown(results),
+        "runs": playlist_sizes(results, youtube)
+    }
+
+    print_report(record, previous_result(params))
+
+    if not args.no_save:
+        RESULTS_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(RESULTS_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        print(f"\nResult appended to {RESULTS_PATH.relative_to(PROJECT_ROOT)}")
+
+    if record["errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+
+
+def measure_import(module: str) -> float:
+    """Wall time of importing module in a fresh interpreter"""
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", f"import {module}"], cwd=PROJECT_ROOT, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+
+def slowest_imports(module: str, top: int = 10) -> list[tuple[int, str]]:
+    """Modules with the highest cumulative import time (microseconds) according to -X importtime"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=PROJECT_ROOT,
+                            capture_output=True, text=True, check=True)
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        timings.append((int(cumulative), name.rstrip()))
+    return sorted(timings, reverse=True)[:top]
+
+
+def main():
+    module = sys.argv[1] if len(sys.argv) > 1 else "recommendation"
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    with open(PROJECT_ROOT / "config.json", "r") as f:
+        budget = json.load(f).get("STARTUP_BUDGET_SECONDS")
+
+    # Graph modules validate API keys at import, dummy values are enough to measure them
+    for apikey in ['OPENAI_API_KEY', 'ANTHROPIC_API_KEY', 'GOOGLE_API_KEY', 'SPOTIPY_CLIENT_ID',
+                   'SPOTIPY_CLIENT_SECRET']:
+        os.environ.setdefault(apikey, "startup-measurement")
+
+    timings = [measure_import(module) for _ in range(runs)]
+    median = statistics.median(timings)
+
+    print("=" * 60)
+    print(f"Startup of '{module}' over {runs} runs")
+    print("=" * 60)
+    print(f"  median: {median:.3f}s  min: {min(timings):.3f}s  max: {max(timings):.3f}s")
+    print(f"  budget: {budget}s" if budget else "  budget: not set (STARTUP_BUDGET_SECONDS)")
+
+    print("\nSlowest imports (cumulative):")
+    for cumulative, name in slowest_imports(module):
+        print(f"  {cumulative / 1e6:7.3f}s  {name}")
+
+    if budget and median > budget:
+        print(f"\n❌ Startup {median:.3f}s exceeds budget of {budget}s")
+        sys.exit(1)
+
+    print("\n✅ Startup within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+# Workers of a spawn-based process pool import this module again, so the project has to be importable here
+sys.path.insert(0, str(PROJECT_ROOT))
+
+REPLAYS_DIR = PROJECT_ROOT / "model_outputs" / "replays"
+RESPONSE_SUFFIX = "_response.json"
+# Written by every voter of older runs, so it holds the ballot of whichever voter finished last
+LEGACY_RESPONSE_FILE = "model_provider_response.json"
+
+_config = None  # Per worker process, set by _init_worker
+
+
+def _response_files(run_dir, pattern):
+    return (path for path in Path(run_dir).glob(pattern) if path.name != LEGACY_RESPONSE_FILE)
+
+
+def find_run_dirs(paths) -> list[Path]:
+    """
+    Run directories (with at least one {voter}_response.json) given directly or anywhere below paths.
+    The LEGACY_RESPONSE_FILE of older runs is skipped with a warning.
+    """
+    run_dirs = set()
+    for path in paths:
+        path = Path(path).resolve()
+        for legacy in path.rglob(LEGACY_RESPONSE_FILE):
+            logging.warning(f"Skipping {legacy}: every voter of the run saved its ballot to this one file")
+        run_dirs.update(response.parent for response in _response_files(path, f"**/*{RESPONSE_SUFFIX}"))
+    return sorted(run_dirs)
+
+
+def load_ballots(run_dir) -> dict:
+    """{voter: RecommendationResponse dict} saved by the voters of a run"""
+    ballots = {}
+    for path in sorted(_response_files(run_dir, f"*{RESPONSE_SUFFIX}")):
+        with open(path, "r", encoding="utf-8") as f:
+            ballots[path.name[:-len(RESPONSE_SUFFIX)]] = json.load(f)
+    return ballots
+
+
+def replay_config(args, replay_id) -> dict:
+    """
+    config.json with the replay overrides. A fake YouTube sink also switches off the video cache,
+    rate limits and the daily quota, so fake videoIds never reach the real cache or budget.
+    """
+    from src.utils import load_config
+
+    config = load_config(PROJECT_ROOT / "config.json")
+    if args.strategy:
+        config["SCORING_STRATEGY"] = args.strategy
+    if args.no_entity_resolution:
+        config["ENTITY_RESOLUTION"]["ENABLED"] = False
+    if args.youtube == "fake":
+        config["VIDEO_CACHE"]["ENABLED"] = False
+        config["RATE_LIMITS"]["ENABLED"] = False
+        config["YOUTUBE"]["DAILY_QUOTA_UNITS"] = None
+        config["YOUTUBE"]["SYNC_PLAYLIST_ID"] = None
+    config["TELEMETRY"] = {
+        **config.get("TELEMETRY", {}),
+        "JSONL_PATH": f"model_outputs/replays/{replay_id}/telemetry/events.jsonl"
+    }
+    config["REPLAY"] = {"YOUTUBE": args.youtube}
+    return config
+
+
+def _init_worker(config):
+    global _config
+    _config = config
+    # Every worker keeps its own process totals
+    telemetry_dir = Path(config["TELEMETRY"]["JSONL_PATH"]).parent
+    _config["TELEMETRY"]["PROMETHEUS_PATH"] = str(telemetry_dir / f"metrics_{os.getpid()}.prom")
+
+    # analyze_responses writes its artifacts relative to the working directory
+    os.chdir(PROJECT_ROOT)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if config["REPLAY"]["YOUTUBE"] == "fake":
+        import src.youtube_integration
+        from src.scripts.benchmark import FakeYouTubeService
+
+        youtube = FakeYouTubeService(latency=0.0, jitter=0.0)
+        src.youtube_integration.get_youtube_credentials = lambda *args, **kwargs: None
+        src.youtube_integration.get_youtube_service = lambda *args, **kwargs: youtube
+
+
+def replay_run(run, replay_id) -> dict:
+    """
+    Feed the saved ballots of a run as voter outputs into analyze_responses, in a worker process.
+    run: {"name", "run_id"} of a run in the RUN_STORE or {"name", "run_dir"} of a folder of *_response.json files
+    """
+    import contextlib
+    import io
+
+    from src.quorum import VOTED
+    from src.run_store import get_run_store
+    from src.youtube_integration import analyze_responses
+
+    if "run_id" in run:
+        ballots = get_run_store(_config).load_ballots(run["run_id"])
+    else:
+        ballots = load_ballots(run["run_dir"])
+
+    state = {
+        "responses": ballots,
+        "voter_status": {voter: VOTED for voter in ballots},
+        # Artifacts of the replay go next to the original run, analyze_responses expects a flat folder name
+        "current_time": f"{run['name']}_replay_{replay_id}",
+        "run_id": uuid.uuid4().hex,
+        "replay_of": run.get("run_id", run["name"]),
+        "playlist_name": f"Replay of {run['name']}",
+        "prompt_attributes": {}
+    }
+
+    started = time.perf_counter()
+    # Playlist resolution prints every searched song
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = analyze_responses(state, script_config=_config)
+    wall_seconds = time.perf_counter() - started
+
+    final_recommendations = result["final_recommendations"]
+    top_songs = [f"{song_title} - {final_recommendations['artist'][index]}"
+                 for index, song_title in list(final_recommendations["song_title"].items())[:10]]
+    return {
+        **run,
+        "participants": result["participants"],
+        "playlist_id": result["playlist_id"],
+        "top_songs": top_songs,
+        "wall_seconds": round(wall_seconds, 4)
+    }
+
+
+def main():
+    from src.aggregation import SCORING_STRATEGIES
+    from src.utils import new_run_timestamp
+
+    parser = argparse.ArgumentParser(description="Rerun aggregation and playlisting from saved model_outputs runs")
+    parser.add_argument("paths", nargs="*", help="Run directories or directories containing them")
+    parser.add_argument("--store", action="store_true", help="Replay the runs of the RUN_STORE instead of folders")
+    parser.add_argument("--since", default=None, help="With --store, first run timestamp, e.g. 2026_10_01")
+    parser.add_argument("--until", default=None, help="With --store, last run timestamp (prefixes include all)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--youtube", choices=["fake", "real"], default="fake",
+                        help="Playlist sink, real creates playlists with client_secrets.json")
+    parser.add_argument("--strategy", default=None, choices=SCORING_STRATEGIES, help="SCORING_STRATEGY to replay with")
+    parser.add_argument("--no-entity-resolution", action="store_true")
+    args = parser.parse_args()
+
+    # Replays started in the same second write to their own folders
+    replay_id = new_run_timestamp()
+    config = replay_config(args, replay_id)
+
+    if args.store:
+        from src.run_store import get_run_store
+
+        run_store = get_run_store(config)
+        if run_store is None:
+            print("❌ RUN_STORE is disabled in config.json")
+            sys.exit(1)
+        runs = [{"name": run["run_timestamp"], "run_id": run["run_id"]}
+                for run in run_store.runs(args.since, args.until)]
+    else:
+        runs = [{"name": run_dir.name, "run_dir": str(run_dir)} for run_dir in find_run_dirs(args.paths)]
+    if not runs:
+        print(f"❌ No runs found in {'the run store' if args.store else args.paths}")
+        sys.exit(1)
+
+    output_dir = REPLAYS_DIR / replay_id
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    print(f"Replaying {len(runs)} runs with {args.workers} workers (YouTube: {args.youtube})")
+    started = time.perf_counter()
+    summaries, failures = [], 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(config,)) as executor:
+        futures = {executor.submit(replay_run, run, replay_id): run for run in runs}
+        with open(output_dir / "summary.jsonl", "w", encoding="utf-8") as f:
+            for future in as_completed(futures):
+                try:
+                    summary = future.result()
+                except Exception as e:
+                    failures += 1
+                    summary = {**futures[future], "error": str(e)}
+                    print(f"❌ {futures[future]['name']}: {e}")
+                summaries.append(summary)
+                f.write(json.dumps(summary, ensure_ascii=False) + "\n")
+    wall_seconds = time.perf_counter() - started
+
+    replayed = [summary["wall_seconds"] for summary in summaries if "error" not in summary]
+    print("=" * 60)
+    print(f"Replayed {len(replayed)}/{len(runs)} runs in {wall_seconds:.2f}s "
+          f"({len(replayed) / wall_seconds:.1f} runs/s)")
+    if replayed:
+        print(f"  per run: median {sorted(replayed)[len(replayed) // 2]:.3f}s  max {max(replayed):.3f}s")
+    print(f"  outputs: {output_dir.relative_to(PROJECT_ROOT)}")
+    print("=" * 60)
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
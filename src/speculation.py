@@ -0,0 +1,162 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from langchain.chat_models import init_chat_model
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from src.prompts import RECOMMENDATION_PROMPT
+from src.rate_limiter import estimate_tokens, get_provider_name, get_provider_rate_limiter
+from src.resilience import get_provider_health
+from src.telemetry import get_telemetry, timed
+from src.schemas import RecommendationResponse
+from src.utils import TOKENS_PER_RECOMMENDATION
+
+# Background work never competes with the graph for more than this many threads
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="speculation")
+
+_prefetchers = {}
+_prefetchers_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_speculation_model(model):
+    """Cheap model used for speculative candidates, created once and reused"""
+    return init_chat_model(model=model, temperature=0.0).with_structured_output(
+        RecommendationResponse,
+        method="function_calling"
+    )
+
+
+class SpeculativePrefetcher:
+    """
+    Generates candidate songs in the background while the user is still answering questions.
+    Speculation starts once all TRIGGER_ATTRIBUTES are known and is discarded when an answer it used changes.
+    """
+
+    def __init__(self, script_config):
+        self.config = script_config.get("SPECULATIVE_PREFETCH", {})
+        self.script_config = script_config
+        self.used_attributes = None
+        self.future = None
+        self.cancelled = None
+        self.observed_at = time.monotonic()
+
+    def observe(self, prompt_attributes: dict[str, str]):
+        """Called after every accepted answer - starts, keeps or restarts the speculation"""
+        self.observed_at = time.monotonic()
+        trigger_attributes = self.config.get("TRIGGER_ATTRIBUTES", ["genre", "favorite_artists"])
+        if not all(prompt_attributes.get(attr) for attr in trigger_attributes):
+            return
+
+        if self.used_attributes is not None and self._still_valid(prompt_attributes):
+            return
+
+        self.cancel()
+        self.used_attributes = dict(prompt_attributes)
+        self.cancelled = threading.Event()
+        self.future = _executor.submit(self._generate_candidates, dict(prompt_attributes), self.cancelled)
+        logging.info(f"Speculative prefetch started with {list(prompt_attributes)}")
+
+    def _still_valid(self, prompt_attributes):
+        return all(prompt_attributes.get(attr) == value for attr, value in self.used_attributes.items())
+
+    def cancel(self):
+        if self.future is not None:
+            self.cancelled.set()
+            self.future.cancel()
+            self.future = None
+            self.used_attributes = None
+
+    def _generate_candidates(self, prompt_attributes, cancelled):
+        messages = [
+            SystemMessage(content=RECOMMENDATION_PROMPT.format(NO_OF_SONGS=self.script_config['NO_OF_SONGS'])),
+            HumanMessage(content="Criteria known so far:\n" +
+                                 "".join(f"{attr}: {value}\n" for attr, value in prompt_attributes.items()))
+        ]
+        model_name = self.config.get("MODEL", "openai:gpt-4o-mini")
+        model = get_speculation_model(model_name)
+        # Speculation shares the provider budget with the voters, so it cannot push them into 429s
+        rate_limiter = get_provider_rate_limiter(model_name, self.script_config)
+        if rate_limiter is not None:
+            rate_limiter.acquire(estimate_tokens(messages, self.script_config['NO_OF_SONGS'] * TOKENS_PER_RECOMMENDATION))
+        with timed(get_telemetry(self.script_config), "speculation", provider=get_provider_name(model_name),
+                   model=model_name):
+            response = model.invoke(messages)
+        candidates = response.model_dump()['recommendations']
+
+        if self.config.get("WARM_VIDEO_CACHE", False) and not cancelled.is_set():
+            self._warm_video_cache(candidates, cancelled)
+
+        return candidates
+
+    def _warm_video_cache(self, candidates, cancelled):
+        # Imported here so the prompt builder does not pull in the YouTube client unless warming is enabled
+        from src.cache import get_video_cache
+        from src.youtube_integration import YouTubePlaylistCreator, get_youtube_quota_limiter
+
+        video_cache = get_video_cache(self.script_config)
+        if video_cache is None:
+            return
+
+        youtube_creator = YouTubePlaylistCreator(video_cache=video_cache,
+                                                 quota_limiter=get_youtube_quota_limiter(self.script_config),
+                                                 request_timeout=self.script_config.get("YOUTUBE", {}).get("TIMEOUT_SECONDS"),
+                                                 health=get_provider_health("youtube", self.script_config))
+        youtube_creator.authenticate()
+        for candidate in candidates:
+            if cancelled.is_set():
+                return
+            youtube_creator.resolve_video(candidate['song_title'], candidate['artist'])
+
+    def take(self, prompt_attributes: dict[str, str]):
+        """
+        Candidate recommendations if the speculation matches the final attributes and has already finished.
+        Never waits, the intake is not held up by a speculation that is still running.
+        """
+        if self.future is None or not self._still_valid(prompt_attributes):
+            self.cancel()
+            return None
+
+        try:
+            if self.future.done():
+                return self.future.result()
+            logging.info("Speculative prefetch not ready, continuing without it")
+        except Exception as e:
+            logging.error(f"Speculative prefetch failed: {e}")
+        finally:
+            self.cancel()
+        return None
+
+
+def _evict_abandoned(max_age):
+    """Cancel the prefetchers of intakes without an answer for max_age seconds, the user left them"""
+    now = time.monotonic()
+    for run_key in [key for key, prefetcher in _prefetchers.items() if now - prefetcher.observed_at > max_age]:
+        _prefetchers.pop(run_key).cancel()
+
+
+def observe_attributes(run_key, prompt_attributes, script_config):
+    """
+    Feed the answers collected so far for a conversation (thread_id) to its prefetcher.
+    Without a thread_id concurrent intakes could not be told apart, so they are not speculated on.
+    """
+    speculation_config = script_config.get("SPECULATIVE_PREFETCH", {})
+    if not speculation_config.get("ENABLED", False) or run_key is None:
+        return
+    with _prefetchers_lock:
+        _evict_abandoned(speculation_config.get("MAX_AGE_SECONDS", 3600))
+        prefetcher = _prefetchers.setdefault(run_key, SpeculativePrefetcher(script_config))
+    prefetcher.observe(prompt_attributes)
+
+
+def take_candidates(run_key, prompt_attributes):
+    if run_key is None:
+        return None
+    with _prefetchers_lock:
+        prefetcher = _prefetchers.pop(run_key, None)
+    if prefetcher is None:
+        return None
+    return prefetcher.take(prompt_attributes)
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.aggregation import aggregate_configured_ballots, build_ballot_batch
+from src.entity_resolution import song_key
+from src.resilience import get_provider_health
+from src.telemetry import get_telemetry
+
+_resolvers = {}
+_resolvers_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(script_config):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = script_config.get("YOUTUBE", {}).get("SEARCH_WORKERS", 5)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="streaming")
+        return _executor
+
+
+class StreamingResolver:
+    """
+    Running tally of a run's ballots. Every time a ballot arrives the songs currently in the top TOP_N
+    are sent to video resolution, so YouTube searches overlap with waiting for the remaining voters.
+    """
+
+    def __init__(self, script_config, run_id=None):
+        # Imported here so the voters do not pull in the YouTube client unless streaming is enabled
+        from src.cache import get_video_cache
+        from src.youtube_integration import YouTubePlaylistCreator, get_youtube_quota_limiter
+
+        self.script_config = script_config
+        self.top_n = script_config.get("STREAMING_RESOLUTION", {}).get("TOP_N", 20)
+        self.created_at = time.monotonic()
+        self.ballots = {}
+        self.futures = {}  # song_key -> Future of videoId
+        self.lock = threading.Lock()
+        self.youtube_creator = YouTubePlaylistCreator(
+            video_cache=get_video_cache(script_config),
+            quota_limiter=get_youtube_quota_limiter(script_config),
+            request_timeout=script_config.get("YOUTUBE", {}).get("TIMEOUT_SECONDS"),
+            health=get_provider_health("youtube", script_config),
+            telemetry=get_telemetry(script_config),
+            run_id=run_id
+        )
+
+    def _resolve(self, song_title, artist):
+        self.youtube_creator._ensure_authenticated()
+        return self.youtube_creator.resolve_video(song_title, artist)
+
+    def add_ballot(self, voter, ballot):
+        with self.lock:
+            self.ballots[voter] = ballot
+            batch = build_ballot_batch({"tally": self.ballots})
+            tally = aggregate_configured_ballots(batch, self.script_config)
+
+            executor = _get_executor(self.script_config)
+            for song_title, artist in zip(tally['song_title'].head(self.top_n), tally['artist'].head(self.top_n)):
+                key = song_key(song_title, artist)
+                if key not in self.futures:
+                    self.futures[key] = executor.submit(self._resolve, song_title, artist)
+
+        logging.info(f"Tally updated with {voter}, {len(self.futures)} songs sent to video resolution")
+
+    def discard(self):
+        """Drop the searches that have not started yet"""
+        with self.lock:
+            for future in self.futures.values():
+                future.cancel()
+
+
+def _evict_stale_resolvers(script_config):
+    """Discard resolvers of runs that never reached the playlist step, e.g. abandoned or crashed runs"""
+    max_age = script_config.get("STREAMING_RESOLUTION", {}).get("MAX_AGE_SECONDS", 3600)
+    now = time.monotonic()
+    for run_id in [run_id for run_id, resolver in _resolvers.items() if now - resolver.created_at > max_age]:
+        logging.info(f"Discarding streaming resolver of stale run {run_id}")
+        _resolvers.pop(run_id).discard()
+
+
+def stream_ballot(run_id, voter, ballot, script_config):
+    """Feed a voter's ballot to the streaming resolver of its run (no-op unless STREAMING_RESOLUTION is enabled)"""
+    if run_id is None or not script_config.get("STREAMING_RESOLUTION", {}).get("ENABLED", False):
+        return
+    if not ballot['recommendations']:
+        return
+
+    with _resolvers_lock:
+        if run_id not in _resolvers:
+            _evict_stale_resolvers(script_config)
+            _resolvers[run_id] = StreamingResolver(script_config, run_id)
+        resolver = _resolvers[run_id]
+
+    try:
+        resolver.add_ballot(voter, ballot)
+    except Exception as e:
+        # Streaming is only an optimisation, the playlist step resolves anything missing
+        logging.error(f"Streaming resolution failed for {voter}: {e}")
+
+
+async def astream_ballot(run_id, voter, ballot, script_config):
+    """
+    stream_ballot for the voters on the event loop. Setting up the resolver (caches, limiter) and
+    re-aggregating the tally block, so they run in a thread.
+    """
+    if run_id is None or not script_config.get("STREAMING_RESOLUTION", {}).get("ENABLED", False):
+        return
+    await asyncio.to_thread(stream_ballot, run_id, voter, ballot, script_config)
+
+
+def pop_prefetched_videos(run_id):
+    """Futures of videoIds already being resolved for a run, keyed by song_key"""
+    with _resolvers_lock:
+        resolver = _resolvers.pop(run_id, None)
+    return resolver.futures if resolver else {}
+
+
+def discard_prefetched_videos(run_id):
+    """Release the resolver of a run that is over, whether or not its prefetched videos were used"""
+    with _resolvers_lock:
+        resolver = _resolvers.pop(run_id, None)
+    if resolver is not None:
+        resolver.discard()
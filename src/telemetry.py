@@ -0,0 +1,166 @@
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+
+class Telemetry:
+    """
+    Wall time, tokens, estimated cost and cache hits of every instrumented stage.
+    Each event is appended to a JSONL file and kept in its run's record until finish_run();
+    process-wide totals are written as a Prometheus text-format snapshot for local scraping.
+    """
+
+    def __init__(self, jsonl_path, prometheus_path, prices=None):
+        self.jsonl_path = PROJECT_ROOT / jsonl_path
+        self.prometheus_path = PROJECT_ROOT / prometheus_path
+        self.prices = prices or {}
+        self.runs = defaultdict(list)
+        self.totals = defaultdict(float)  # (metric, labels) -> value
+        self.lock = threading.Lock()
+        self.jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+        self.prometheus_path.parent.mkdir(parents=True, exist_ok=True)
+
+    def estimate_cost(self, model, input_tokens, output_tokens):
+        """USD cost from PRICES_PER_MTOK, None if the model has no price or reported no tokens"""
+        price = self.prices.get(model)
+        if not price or input_tokens is None or output_tokens is None:
+            return None
+        return (input_tokens * price["INPUT"] + output_tokens * price["OUTPUT"]) / 1_000_000
+
+    def record(self, run_id, stage, wall_seconds, provider=None, model=None, input_tokens=None,
+               output_tokens=None, cache_hit=False, status="ok", **extra):
+        event = {
+            "timestamp": datetime.now().isoformat(timespec="milliseconds"),
+            "run_id": run_id,
+            "stage": stage,
+            "provider": provider,
+            "model": model,
+            "wall_seconds": round(wall_seconds, 4),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cost_usd": self.estimate_cost(model, input_tokens, output_tokens),
+            "cache_hit": cache_hit,
+            "status": status,
+            **extra
+        }
+
+        labels = (("stage", stage), ("provider", provider or ""), ("status", status))
+        with self.lock:
+            if run_id is not None:
+                self.runs[run_id].append(event)
+
+            self.totals[("musicology_stage_calls_total", labels)] += 1
+            self.totals[("musicology_stage_seconds_total", labels)] += wall_seconds
+            self.totals[("musicology_cache_hits_total", labels)] += int(cache_hit)
+            self.totals[("musicology_input_tokens_total", labels)] += input_tokens or 0
+            self.totals[("musicology_output_tokens_total", labels)] += output_tokens or 0
+            self.totals[("musicology_cost_usd_total", labels)] += event["cost_usd"] or 0
+
+            with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+    def finish_run(self, run_id, current_time=None, write_metrics=True):
+        """
+        Close a run's record: totals per stage and provider, also written to model_outputs/{current_time}/metrics.json
+        with write_metrics (the run store keeps them otherwise). Also refreshes the Prometheus snapshot.
+        """
+        with self.lock:
+            events = self.runs.pop(run_id, [])
+
+        stages = defaultdict(lambda: {"calls": 0, "wall_seconds": 0.0, "input_tokens": 0, "output_tokens": 0,
+                                      "cost_usd": 0.0, "cache_hits": 0, "errors": 0})
+        for event in events:
+            key = event["stage"] if event["provider"] is None else f"{event['stage']}:{event['provider']}"
+            stage = stages[key]
+            stage["calls"] += 1
+            stage["wall_seconds"] += event["wall_seconds"]
+            stage["input_tokens"] += event["input_tokens"] or 0
+            stage["output_tokens"] += event["output_tokens"] or 0
+            stage["cost_usd"] += event["cost_usd"] or 0
+            stage["cache_hits"] += int(event["cache_hit"])
+            stage["errors"] += int(event["status"] not in ("ok", "voted", "cached"))
+
+        summary = {
+            "run_id": run_id,
+            "current_time": current_time,
+            "input_tokens": sum(stage["input_tokens"] for stage in stages.values()),
+            "output_tokens": sum(stage["output_tokens"] for stage in stages.values()),
+            "cost_usd": sum(stage["cost_usd"] for stage in stages.values()),
+            "stages": dict(stages)
+        }
+
+        if current_time and write_metrics:
+            output_dir = PROJECT_ROOT / "model_outputs" / current_time
+            output_dir.mkdir(parents=True, exist_ok=True)
+            with open(output_dir / "metrics.json", "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2)
+
+        self.write_prometheus()
+        return summary
+
+    def write_prometheus(self):
+        """Prometheus text exposition of the process totals, replaced atomically"""
+        with self.lock:
+            totals = dict(self.totals)
+
+        lines = []
+        for metric in sorted({metric for metric, _ in totals}):
+            lines.append(f"# TYPE {metric} counter")
+            for (name, labels), value in sorted(totals.items()):
+                if name == metric:
+                    label_text = ",".join(f'{key}="{value_}"' for key, value_ in labels)
+                    lines.append(f"{metric}{{{label_text}}} {value:g}")
+
+        tmp_path = self.prometheus_path.with_suffix(".tmp")
+        tmp_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        tmp_path.replace(self.prometheus_path)
+
+
+_telemetry = None
+_telemetry_lock = threading.Lock()
+
+
+def get_telemetry(script_config):
+    """Process-wide Telemetry from TELEMETRY in config.json (None when telemetry is disabled)"""
+    global _telemetry
+    telemetry_config = (script_config or {}).get("TELEMETRY", {})
+    if not telemetry_config.get("ENABLED", False):
+        return None
+
+    with _telemetry_lock:
+        if _telemetry is None:
+            _telemetry = Telemetry(
+                jsonl_path=telemetry_config.get("JSONL_PATH", "model_outputs/telemetry/events.jsonl"),
+                prometheus_path=telemetry_config.get("PROMETHEUS_PATH", "model_outputs/telemetry/metrics.prom"),
+                prices=telemetry_config.get("PRICES_PER_MTOK", {})
+            )
+        return _telemetry
+
+
+@contextmanager
+def timed(telemetry, stage, run_id=None, **fields):
+    """
+    Record the wall time of the with-block as a stage event. The yielded dict takes the fields only known
+    inside the block (tokens, cache_hit, status); an exception marks the event as an error.
+    """
+    event = dict(fields)
+    started = time.perf_counter()
+    try:
+        yield event
+    except BaseException:
+        event["status"] = "error"
+        raise
+    finally:
+        if telemetry is not None:
+            try:
+                telemetry.record(run_id, stage, time.perf_counter() - started, **event)
+            except Exception as e:
+                # Telemetry must never fail the stage it measures
+                logging.error(f"Could not record telemetry of {stage}: {e}")
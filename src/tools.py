@@ -1,23 +1,67 @@
-from langchain_community.tools import DuckDuckGoSearchRun, WikipediaQueryRun
-from langchain_community.utilities import WikipediaAPIWrapper
+import threading
+import time
+from functools import lru_cache
+
 from langchain_core.tools import Tool
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
 
-# DuckDuckGo Search
-search_tool = DuckDuckGoSearchRun()
+# Spotify (requires SPOTIPY_CLIENT_ID and SPOTIPY_CLIENT_SECRET in .env)
 
-# Wikipedia
-wikipedia = WikipediaQueryRun(api_wrapper=WikipediaAPIWrapper())
+SPOTIFY_RESULTS_TTL_SECONDS = 600
+SPOTIFY_RESULTS_MAX_ENTRIES = 1024
+SPOTIFY_POOL_SIZE = 16
+SPOTIFY_BACKOFF_FACTOR = 0.3
 
-# Spotify
+_spotify_client = None
+_spotify_client_lock = threading.Lock()
+_spotify_results = {}  # normalized query -> (timestamp, formatted output)
+_spotify_results_lock = threading.Lock()
+
+
+def get_spotify_client():
+    """
+    Process-wide Spotify client. The client-credentials token lives in memory and is reused until it expires,
+    and all calls share one pooled requests session, so the voters keep reusing the same connections.
+    """
+    global _spotify_client
+    with _spotify_client_lock:
+        if _spotify_client is None:
+            # Imported on first use, most runs never reach the Spotify tool
+            import requests
+            import spotipy
+            from requests.adapters import HTTPAdapter
+            from spotipy.cache_handler import MemoryCacheHandler
+            from spotipy.oauth2 import SpotifyClientCredentials
+            from urllib3.util.retry import Retry
+
+            # A session of our own skips spotipy's, so its retries on 429 and 5xx are set up here the same way
+            retry = Retry(
+                total=spotipy.Spotify.max_retries,
+                connect=None,
+                read=False,
+                allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+                status=spotipy.Spotify.max_retries,
+                backoff_factor=SPOTIFY_BACKOFF_FACTOR,
+                status_forcelist=spotipy.Spotify.default_retry_codes
+            )
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=SPOTIFY_POOL_SIZE, max_retries=retry)
+            session.mount('https://', adapter)
+
+            auth_manager = SpotifyClientCredentials(cache_handler=MemoryCacheHandler(), requests_session=session)
+            _spotify_client = spotipy.Spotify(auth_manager=auth_manager, requests_session=session)
+        return _spotify_client
 
 
-# Spotify (requires SPOTIPY_CLIENT_ID and SPOTIPY_CLIENT_SECRET in .env)
 def spotify_search(query: str) -> str:
     """Search Spotify for songs, artists, or albums"""
+    cache_key = " ".join(query.casefold().split())
+    with _spotify_results_lock:
+        cached = _spotify_results.get(cache_key)
+    if cached and time.monotonic() - cached[0] < SPOTIFY_RESULTS_TTL_SECONDS:
+        return cached[1]
+
     try:
-        sp = spotipy.Spotify(auth_manager=SpotifyClientCredentials())
+        sp = get_spotify_client()
         results = sp.search(q=query, limit=5, type='track,artist')
 
         output = []
@@ -36,24 +80,44 @@ def spotify_search(query: str) -> str:
                 genres = ', '.join(artist['genres'][:3]) if artist['genres'] else 'N/A'
                 output.append(f"  - {artist['name']} (Genres: {genres})")
 
-        return '\n'.join(output) if output else "No results found"
+        result = '\n'.join(output) if output else "No results found"
+        with _spotify_results_lock:
+            _spotify_results.pop(cache_key, None)
+            _spotify_results[cache_key] = (time.monotonic(), result)
+            if len(_spotify_results) > SPOTIFY_RESULTS_MAX_ENTRIES:
+                # Dicts keep insertion order, so the first entry is the oldest one
+                del _spotify_results[next(iter(_spotify_results))]
+        return result
+
     except Exception as e:
         return f"Spotify search error: {str(e)}"
 
-tools = [
-    Tool(
-        name="web_search",
-        description="Search the web for real, existing songs and artists. Use for general web information.",
-        func=search_tool.run,
-    ),
-    Tool(
-        name="wikipedia",
-        description="Search Wikipedia for detailed information about artists, bands, albums, or music history.",
-        func=wikipedia.run,
-    ),
-    Tool(
-        name="spotify_search",
-        description="Search Spotify for songs, artists, and albums. Returns real music data including track names, artists, and genres. Best for finding actual songs and verifying they exist.",
-        func=spotify_search,
-    )
-]
\ No newline at end of file
+@lru_cache(maxsize=None)
+def get_tools():
+    """Search tools for the voters, built on first use because the langchain_community imports are slow"""
+    from langchain_community.tools import DuckDuckGoSearchRun, WikipediaQueryRun
+    from langchain_community.utilities import WikipediaAPIWrapper
+
+    # DuckDuckGo Search
+    search_tool = DuckDuckGoSearchRun()
+
+    # Wikipedia
+    wikipedia = WikipediaQueryRun(api_wrapper=WikipediaAPIWrapper())
+
+    return [
+        Tool(
+            name="web_search",
+            description="Search the web for real, existing songs and artists. Use for general web information.",
+            func=search_tool.run,
+        ),
+        Tool(
+            name="wikipedia",
+            description="Search Wikipedia for detailed information about artists, bands, albums, or music history.",
+            func=wikipedia.run,
+        ),
+        Tool(
+            name="spotify_search",
+            description="Search Spotify for songs, artists, and albums. Returns real music data including track names, artists, and genres. Best for finding actual songs and verifying they exist.",
+            func=spotify_search,
+        )
+    ]
@@ -1,13 +1,32 @@
+import asyncio
 import json
 import logging
 import os
+import uuid
+import weakref
+from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 
 from langchain.chat_models import init_chat_model
 from langchain_core.messages import HumanMessage, SystemMessage
 
-from src.prompts import VALIDATION_PROMPTS, RECOMMENDATION_PROMPT
+from src.cache import get_response_cache, make_response_cache_key
+from src.prompts import CANDIDATES_PROMPT, VALIDATION_PROMPTS, RECOMMENDATION_PROMPT
+from src.quorum import CACHED, CIRCUIT_OPEN, get_run_quorum, vote
+from src.rate_limiter import estimate_tokens, get_provider_name, get_provider_rate_limiter, used_tokens
+from src.registry import get_provider_config
+from src.resilience import get_provider_health
+from src.run_store import writes_run_artifacts
+from src.streaming import astream_ballot
+from src.telemetry import get_telemetry, timed
 from src.schemas import RecommendationResponse
+from src.validation import validate_locally
+
+# Expected completion sizes, reserved from the TPM budget before a call is made
+VALIDATION_OUTPUT_TOKENS = 5
+PLAYLIST_NAME_OUTPUT_TOKENS = 20
+TOKENS_PER_RECOMMENDATION = 80
 
 
 def generate_graph_image(app):
@@ -27,15 +46,17 @@ def generate_graph_image(app):
 
 
 def count_tokens(model_provider, response):
-    if model_provider == 'anthropic':
+    """(input_tokens, output_tokens) of a chat model response, (None, None) if the provider reported no usage"""
+    if getattr(response, 'usage_metadata', None):
+        return response.usage_metadata['input_tokens'], response.usage_metadata['output_tokens']
+
+    input_tokens = output_tokens = None
+    if model_provider == 'anthropic' and response.response_metadata.get('usage'):
         input_tokens = response.response_metadata.get('usage').get('input_tokens')
         output_tokens = response.response_metadata.get('usage').get('output_tokens')
-    elif model_provider == 'openai':
+    elif model_provider == 'openai' and response.response_metadata.get('token_usage'):
         input_tokens = response.response_metadata.get('token_usage').get('prompt_tokens')
         output_tokens = response.response_metadata.get('token_usage').get('completion_tokens')
-    elif model_provider == 'google':
-        input_tokens = response.usage_metadata['input_tokens']
-        output_tokens = response.usage_metadata['output_tokens']
 
     return input_tokens, output_tokens
 
@@ -47,14 +68,43 @@ def validate_apikeys():
             raise ValueError(f"{apikey} not found in environment variables")
 
 
-def validate_user_input(attribute: str, user_input: str) -> bool:
+@lru_cache(maxsize=None)
+def get_chat_model(model="openai:gpt-4o-mini"):
+    """Tiny, cheap and fast helper model (validation, playlist names), created once and reused"""
+    return init_chat_model(model=model, temperature=0.0)
+
+
+def _invoke_helper_model(llm, messages, model, script_config, stage, expected_output_tokens=0, run_id=None):
     """
-    Use GPT-4o-mini to validate user input for a given attribute.
+    Invoke a helper model once its provider's RPM/TPM budget from RATE_LIMITS allows it,
+    recording the call as a telemetry stage
+    """
+    rate_limiter = get_provider_rate_limiter(model, script_config)
+    estimated_tokens = estimate_tokens(messages, expected_output_tokens)
+    if rate_limiter is not None:
+        rate_limiter.acquire(estimated_tokens)
+
+    with timed(get_telemetry(script_config), stage, run_id, provider=get_provider_name(model), model=model) as event:
+        response = llm.invoke(messages)
+        event["input_tokens"], event["output_tokens"] = count_tokens(get_provider_name(model), response)
+
+    if rate_limiter is not None:
+        rate_limiter.settle(estimated_tokens, used_tokens(response))
+    return response
+
+
+def validate_user_input(attribute: str, user_input: str, validator_model="openai:gpt-4o-mini",
+                        script_config=None) -> bool:
+    """
+    Validate user input for a given attribute.
+    Easy cases are settled locally, only ambiguous input goes to the validator LLM.
     Returns True if valid, False otherwise.
     """
-    # TODO: Enable choice of the validator model
-    # Separate tiny, cheap and fast model to validate user inputs.
-    llm_validator = init_chat_model(model="openai:gpt-4o-mini", temperature=0.0)
+    local_result = validate_locally(attribute, user_input)
+    if local_result is not None:
+        logging.info(f"Local validation for '{attribute}' with input '{user_input}': {local_result}")
+        return local_result
+
     validation_prompt = VALIDATION_PROMPTS.get(attribute)
 
     if not validation_prompt:
@@ -62,12 +112,14 @@ def validate_user_input(attribute: str, user_input: str) -> bool:
         return True  # If no validation prompt, accept the input
 
     try:
+        llm_validator = get_chat_model(validator_model)
         messages = [
             SystemMessage(content=validation_prompt),
             HumanMessage(content=f"User input: {user_input}")
         ]
 
-        response = llm_validator.invoke(messages)
+        response = _invoke_helper_model(llm_validator, messages, validator_model, script_config, "validator",
+                                        VALIDATION_OUTPUT_TOKENS)
         result = response.content.strip()
 
         logging.info(f"Validation for '{attribute}' with input '{user_input}': {result}")
@@ -80,13 +132,13 @@ def validate_user_input(attribute: str, user_input: str) -> bool:
         return True  # On error, accept the input to not block the user
 
 
-def create_playlist_name(attributes: str) -> str:
+def create_playlist_name(attributes: str, model="openai:gpt-4o-mini", script_config=None, run_id=None) -> str:
     """
-    Use GPT-4o-mini to validate user input for a given attribute.
-    Returns True if valid, False otherwise.
+    Use GPT-4o-mini to come up with a short YouTube playlist name for given prompt attributes.
+    Returns None if the name could not be generated.
     """
 
-    llm_title_creator = init_chat_model(model="openai:gpt-4o-mini", temperature=0.0)
+    llm_title_creator = get_chat_model(model)
     system_prompt = """You are a helpful assistant that receives as input the attributes
                     passed to a AI music recommendation system and comes up with a name for
                     a playlist setup with these songs for the user"""
@@ -102,14 +154,59 @@ def create_playlist_name(attributes: str) -> str:
             HumanMessage(content=f"User input: {title_prompt}")
         ]
 
-        response = llm_title_creator.invoke(messages)
+        response = _invoke_helper_model(llm_title_creator, messages, model, script_config, "playlist_name",
+                                        PLAYLIST_NAME_OUTPUT_TOKENS, run_id)
         result = response.content.strip()
 
         return result
 
     except Exception as e:
-        logging.error(f"Error during validation: {e}")
-        return True  # On error, accept the input to not block the user
+        logging.error(f"Error during playlist name generation: {e}")
+        return None
+
+
+def template_playlist_name(prompt_attributes: dict[str, str]) -> str:
+    """Local playlist name from up to 3 prompt attributes, no LLM involved"""
+    keywords = []
+    for attribute in ["genre", "year", "language", "favorite_artists"]:
+        value = " ".join(str(prompt_attributes.get(attribute, "")).split())
+        if value and value.casefold() not in {"any", "none", "-"}:
+            keywords.append(value if len(value) <= 30 else value[:30].rsplit(" ", 1)[0])
+        if len(keywords) == 3:
+            break
+
+    if not keywords:
+        return "AI Music Recommendations"
+    return " · ".join(keyword[0].upper() + keyword[1:] for keyword in keywords)
+
+
+def name_playlist(state, script_config) -> dict:
+    """
+    Graph node naming the playlist. Its only input is known before voting starts,
+    so it runs alongside the voters instead of after them.
+    """
+    prompt_attributes = state.get("prompt_attributes", {})
+    if script_config.get("PLAYLIST_NAME_MODE", "llm") == "template":
+        with timed(get_telemetry(script_config), "playlist_name", state.get("run_id"), provider="template"):
+            return {"playlist_name": template_playlist_name(prompt_attributes)}
+
+    playlist_name = create_playlist_name(state.get("user_question", ""),
+                                         script_config.get("PLAYLIST_NAME_MODEL", "openai:gpt-4o-mini"),
+                                         script_config, state.get("run_id"))
+    return {"playlist_name": playlist_name or template_playlist_name(prompt_attributes)}
+
+
+def new_run_timestamp(run_id=None) -> str:
+    """
+    Timestamp naming the model_outputs folder of a single run. Runs started in the same second
+    get their own folder through the run_id suffix, the timestamp prefix keeps folders in time order.
+    """
+    return f"{datetime.now().strftime('%Y_%m_%d_%H_%M_%S')}_{(run_id or uuid.uuid4().hex)[:8]}"
+
+
+def get_run_timestamp(state) -> str:
+    """Timestamp of the run a node belongs to, set once per run in the graph state"""
+    return state.get("current_time") or new_run_timestamp(state.get("run_id"))
 
 
 def load_config(file_path="config.json"):
@@ -118,48 +215,175 @@ def load_config(file_path="config.json"):
     return config
 
 
-# Get response from any model
-def get_model_response(state, model_provider, current_time, models, script_config) -> dict:
-    """Get response with same System Message to specific Human Message for given Model Provider"""
-
-    messages = [
+def _build_recommendation_messages(state, script_config) -> list:
+    """System + Human messages shared by all voters, with the speculative candidates of the intake if any"""
+    content = state["final_prompt"]
+    candidates = state.get("speculative_candidates")
+    if candidates:
+        content += CANDIDATES_PROMPT.format(CANDIDATES="\n".join(
+            f"- {candidate['artist']} - {candidate['song_title']}" for candidate in candidates
+        ))
+    return [
         SystemMessage(content=RECOMMENDATION_PROMPT.format(NO_OF_SONGS=script_config['NO_OF_SONGS'])),
-        HumanMessage(content=state["final_prompt"])
+        HumanMessage(content=content)
     ]
 
-    if model_provider == "openai":
-        # Use function calling method for OpenAI
-        structured_llm = models[model_provider].with_structured_output(
-            RecommendationResponse,
-            method="function_calling"
-        )
-    else:
-        structured_llm = models[model_provider].with_structured_output(RecommendationResponse)
 
-    response = structured_llm.invoke(messages)
-    # TODO: Fix this guy
-    # tool_calls = response.additional_kwargs.get("tool_calls", [])
+async def _get_structured_llm(model_provider, models):
+    # ModelRegistry keeps one pre-bound runnable per provider
+    if hasattr(models, "astructured"):
+        return await models.astructured(model_provider)
+    return models[model_provider].with_structured_output(RecommendationResponse, include_raw=True)
 
-    # if tool_calls:
-    #     print("✅ Search tool was used")
-    #     for call in tool_calls:
-    #         print(call["name"], call["args"])
-    # else:
-    #     print("❌ Search tool was NOT used")
 
-    # Generate timestamp and filename and model_outputs folder if not present
+def _parse_structured(output):
+    """Split include_raw structured output into the RecommendationResponse and the raw AIMessage (for token usage)"""
+    if output["parsed"] is None:
+        raise output.get("parsing_error") or ValueError("Structured output could not be parsed")
+    return output["parsed"], output["raw"]
 
-    output_dir = Path(__file__).parent.parent / "model_outputs" / current_time
-    output_dir.mkdir(exist_ok=True)
 
-    filename = output_dir / "model_provider_response.json"
+def _response_cache_key(state, messages, model_provider, script_config) -> str:
+    # Keyed by what the user asked, speculative candidates only vary with the timing of the intake
+    return make_response_cache_key(
+        model_provider,
+        get_provider_config(script_config, model_provider)["MODEL"],
+        script_config.get("TEMPERATURE"),
+        messages[0].content,
+        state["final_prompt"]
+    )
 
-    # Dump response to JSON file
-    response_dict = response.model_dump()
+
+_provider_semaphores = weakref.WeakKeyDictionary()
+
+
+def _provider_semaphore(model_provider, script_config):
+    """Per event loop semaphore limiting in-flight calls to a provider to its MAX_CONCURRENCY"""
+    semaphores = _provider_semaphores.setdefault(asyncio.get_running_loop(), {})
+    if model_provider not in semaphores:
+        limit = get_provider_config(script_config, model_provider).get("MAX_CONCURRENCY") or 1_000_000
+        semaphores[model_provider] = asyncio.Semaphore(limit)
+    return semaphores[model_provider]
+
+
+def _recommendation_tokens(messages, script_config) -> int:
+    return estimate_tokens(messages, script_config['NO_OF_SONGS'] * TOKENS_PER_RECOMMENDATION)
+
+
+def _save_model_response(response_dict, model_provider, current_time, script_config):
+    """
+    Generate model_outputs folder if not present and dump response to JSON file.
+    With the RUN_STORE enabled the ballots are stored with the finished run instead, unless RUN_ARTIFACTS is set.
+    """
+    if not writes_run_artifacts(script_config):
+        return
+
+    output_dir = Path(__file__).parent.parent / "model_outputs" / current_time
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # One file per voter, so replays (src/scripts/replay.py) get every ballot of the run back
+    filename = output_dir / f"{model_provider}_response.json"
 
     with open(filename, 'w', encoding='utf-8') as f:
         json.dump(response_dict, f, indent=2, ensure_ascii=False)
 
     logging.info(f"{model_provider} response saved to {filename}")
 
-    return {f"{model_provider}_response": response.model_dump()}
+
+async def aget_model_response(state, model_provider, models, script_config, current_time=None) -> dict:
+    """
+    Get response with same System Message to specific Human Message for given Model Provider.
+    Voters run as coroutines and a provider which does not answer within its TIMEOUT from PROVIDERS, fails,
+    or misses the run's QUORUM is dropped with an empty ballot.
+    A provider whose circuit is open (see RESILIENCE) is not called at all.
+    """
+    provider_config = get_provider_config(script_config, model_provider)
+    with timed(get_telemetry(script_config), "voter", state.get("run_id"), provider=model_provider,
+               model=provider_config["MODEL"]) as event:
+        result = await _avote(state, model_provider, models, script_config, current_time, event)
+        event["status"] = result["voter_status"][model_provider]
+        return result
+
+
+async def _avote(state, model_provider, models, script_config, current_time, event) -> dict:
+    current_time = current_time or get_run_timestamp(state)
+    run_quorum = get_run_quorum(state.get("run_id"), script_config)
+
+    messages = _build_recommendation_messages(state, script_config)
+
+    cache = get_response_cache(script_config)
+    cache_key = _response_cache_key(state, messages, model_provider, script_config)
+    response_dict = cache.get(cache_key) if cache else None
+
+    if response_dict is not None:
+        logging.info(f"{model_provider} response served from cache")
+        event["cache_hit"] = True
+        if run_quorum is not None:
+            run_quorum.record(model_provider)
+        await astream_ballot(state.get("run_id"), model_provider, response_dict, script_config)
+        _save_model_response(response_dict, model_provider, current_time, script_config)
+        return {"responses": {model_provider: response_dict}, "voter_status": {model_provider: CACHED}}
+
+    health = get_provider_health(model_provider, script_config)
+    if not health.allow():
+        return {"responses": {model_provider: {"recommendations": []}}, "voter_status": {model_provider: CIRCUIT_OPEN}}
+
+    structured_llm = await _get_structured_llm(model_provider, models)
+    provider_config = get_provider_config(script_config, model_provider)
+    rate_limiter = get_provider_rate_limiter(provider_config["MODEL"], script_config)
+
+    estimated_tokens = _recommendation_tokens(messages, script_config)
+
+    async def invoke():
+        response, raw = _parse_structured(await structured_llm.ainvoke(messages))
+        # Every answered request, the first one and its hedge alike, replaces its estimate with the actual usage
+        if rate_limiter is not None:
+            await asyncio.to_thread(rate_limiter.settle, estimated_tokens, used_tokens(raw))
+        return response, raw
+
+    async def hedge():
+        # The duplicate request is a request like any other for the provider's budget
+        if rate_limiter is not None:
+            await rate_limiter.aacquire(estimated_tokens)
+        return await invoke()
+
+    async def call():
+        # Queueing for MAX_CONCURRENCY and the shared RPM/TPM budget counts against the provider's TIMEOUT,
+        # so a depleted budget times the voter out instead of holding up the run
+        loop = asyncio.get_running_loop()
+        timeout = provider_config.get("TIMEOUT")
+        deadline = loop.time() + timeout if timeout else None
+        semaphore = _provider_semaphore(model_provider, script_config)
+        acquired = False
+        try:
+            async with asyncio.timeout_at(deadline):
+                await semaphore.acquire()
+                acquired = True
+                if rate_limiter is not None:
+                    await rate_limiter.aacquire(estimated_tokens)
+
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+            # Timeout adapts to the provider's p95, capped by what is left of its TIMEOUT
+            return await health.acall(invoke, remaining, hedge=hedge)
+        finally:
+            if acquired:
+                semaphore.release()
+
+    status, response = await vote(call(), model_provider, run_quorum)
+    if response is None:
+        return {"responses": {model_provider: {"recommendations": []}}, "voter_status": {model_provider: status}}
+
+    response, raw = response
+    event["input_tokens"], event["output_tokens"] = count_tokens(get_provider_name(provider_config["MODEL"]), raw)
+
+    response_dict = response.model_dump()
+    await astream_ballot(state.get("run_id"), model_provider, response_dict, script_config)
+    if cache:
+        cache.set(cache_key, response_dict)
+    _save_model_response(response_dict, model_provider, current_time, script_config)
+
+    return {"responses": {model_provider: response_dict}, "voter_status": {model_provider: status}}
@@ -0,0 +1,95 @@
+import re
+from datetime import datetime
+
+MODES = {"find_for_given_artists", "find_new_artists"}
+
+GENRE_LEXICON = {
+    "acoustic", "afrobeat", "afrobeats", "alternative", "ambient", "americana", "bachata", "ballad", "ballads",
+    "baroque", "bebop", "bluegrass", "blues", "bossa", "breakbeat", "britpop", "cajun", "celtic", "chanson",
+    "chillout", "chillwave", "choral", "classical", "country", "cumbia", "dance", "dancehall", "darkwave",
+    "disco", "dnb", "doom", "downtempo", "drill", "drum", "dubstep", "dub", "edm", "electro", "electronic",
+    "electronica", "emo", "eurodance", "experimental", "fado", "flamenco", "folk", "funk", "fusion", "garage",
+    "gospel", "goth", "gothic", "grime", "grunge", "hardcore", "hardstyle", "heavy", "hip", "hiphop", "hip-hop",
+    "house", "idm", "indie", "industrial", "instrumental", "j-pop", "jazz", "jpop", "jungle", "k-pop", "kpop",
+    "latin", "lo-fi", "lofi", "lounge", "mambo", "mariachi", "merengue", "metal", "metalcore", "minimal", "motown",
+    "neoclassical", "new wave", "noise", "nu", "opera", "orchestral", "pop", "post-punk", "post-rock",
+    "progressive", "psychedelic", "punk", "r&b", "rap", "reggae", "reggaeton", "rnb", "rock", "rockabilly",
+    "salsa", "samba", "shoegaze", "ska", "soul", "soundtrack", "swing", "synth", "synthpop", "synthwave",
+    "tango", "techno", "trance", "trap", "trip-hop", "vaporwave", "world", "zouk",
+}
+
+LANGUAGES = {
+    "arabic", "bengali", "bulgarian", "catalan", "chinese", "croatian", "czech", "danish", "dutch", "english",
+    "estonian", "finnish", "french", "german", "greek", "hebrew", "hindi", "hungarian", "icelandic", "indonesian",
+    "irish", "italian", "japanese", "korean", "latvian", "lithuanian", "malay", "mandarin", "cantonese",
+    "norwegian", "persian", "polish", "portuguese", "punjabi", "romanian", "russian", "serbian", "slovak",
+    "slovenian", "spanish", "swahili", "swedish", "tagalog", "tamil", "thai", "turkish", "ukrainian", "urdu",
+    "vietnamese", "welsh", "yoruba", "any", "instrumental", "mixed", "multilingual", "no lyrics",
+}
+
+LANGUAGE_SEPARATORS = re.compile(r"\s*(?:,|/|&|\+|;|\band\b|\bor\b)\s*")
+
+# 1995, 90s, '90s, 1990s, 2000-2010, 80s-90s, after 2023, before 1980, since 2015, early 2000s ...
+YEAR = r"(?:\d{4}s?|'?\d0s)"
+YEAR_PATTERN = re.compile(
+    rf"^(?:(?:early|mid|late|after|before|since|from|until|around|circa)\s+)?{YEAR}"
+    rf"(?:\s*(?:-|–|to|until)\s*{YEAR})?$"
+)
+YEAR_WORDS = {"any", "modern", "recent", "classic", "oldies", "contemporary", "new", "latest", "current", "today"}
+
+
+def _validate_genre(value):
+    tokens = set(re.split(r"[\s,/]+", value))
+    if value in GENRE_LEXICON or tokens & GENRE_LEXICON:
+        return True
+    if value.replace(" ", "").isdigit():
+        return False
+    return None
+
+
+def _validate_language(value):
+    parts = [part for part in LANGUAGE_SEPARATORS.split(value) if part]
+    if parts and all(part in LANGUAGES for part in parts):
+        return True
+    if value.replace(" ", "").isdigit():
+        return False
+    return None
+
+
+def _validate_year(value):
+    if value in YEAR_WORDS:
+        return True
+
+    if YEAR_PATTERN.match(value):
+        latest_year = datetime.now().year + 1
+        years = [int(year) for year in re.findall(r"\d{4}", value)]
+        return all(1900 <= year <= latest_year for year in years)
+
+    return None
+
+
+def _validate_mode(value):
+    return value in MODES
+
+
+LOCAL_VALIDATORS = {
+    "genre": _validate_genre,
+    "language": _validate_language,
+    "year": _validate_year,
+}
+
+
+def validate_locally(attribute: str, user_input: str) -> bool | None:
+    """
+    Deterministic validation of prompt attributes without calling an LLM.
+    Returns True/False when the answer is certain and None when the input is ambiguous.
+    """
+    if attribute == "mode":
+        # Mode is an exact, case-sensitive enum
+        return _validate_mode(user_input.strip())
+
+    validator = LOCAL_VALIDATORS.get(attribute)
+    if validator is None:
+        return None
+
+    return validator(" ".join(user_input.casefold().split()))
@@ -1,86 +1,356 @@
 
+import bisect
+import json
 import logging
 import os
 import pickle
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
 
+import httplib2
 import pandas as pd
 from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+
+from src.aggregation import aggregate_configured_ballots, build_ballot_batch, provider_weights
+from src.entity_resolution import song_key
+from src.cache import get_video_cache
+from src.quorum import PARTICIPATING_STATUSES, VOTED, close_run_quorum
+from src.rate_limiter import QuotaExceededError, QuotaLimiter, get_shared_bucket, get_shared_daily_quota
+from src.resilience import CircuitOpenError, get_provider_health
+from src.run_store import get_run_store, writes_run_artifacts
 from src.schemas import State
-from src.utils import create_playlist_name
+from src.streaming import discard_prefetched_videos, pop_prefetched_videos
+from src.telemetry import get_telemetry, timed
+from src.utils import get_run_timestamp, template_playlist_name
+
+PROJECT_ROOT = Path(__file__).parent.parent
 
 SCOPES = ['https://www.googleapis.com/auth/youtube.force-ssl']
 
+# Quota cost in units of YouTube Data API v3 calls
+SEARCH_COST = 100
+WRITE_COST = 50
+
+# Maximum number of calls the YouTube batch endpoint accepts in a single HTTP request
+BATCH_SIZE = 50
+
+# Credentials are refreshed this long before they expire so no request has to wait for it
+CREDENTIALS_REFRESH_MARGIN = timedelta(minutes=5)
+
+_quota_limiter = None
+_quota_limiter_lock = threading.Lock()
+
+_credentials = None
+_credentials_lock = threading.Lock()
+_discovery_document = None
+_thread_services = threading.local()
+
+
+def _load_credentials(client_secrets_file):
+    """Load OAuth 2.0 credentials from token.pickle, refreshing them or logging the user in when needed"""
+    creds = None
+
+    # Token file stores the user's access and refresh tokens
+    if os.path.exists('token.pickle'):
+        with open('token.pickle', 'rb') as token:
+            creds = pickle.load(token)
+
+    # If there are no valid credentials, let the user log in
+    if not creds or not creds.valid:
+        if creds and creds.expired and creds.refresh_token:
+            creds.refresh(Request())
+        else:
+            flow = InstalledAppFlow.from_client_secrets_file(client_secrets_file, SCOPES)
+            creds = flow.run_local_server(port=0)
+
+        _save_credentials(creds)
+
+    return creds
+
+
+def _save_credentials(creds):
+    # Save the credentials for the next run
+    with open('token.pickle', 'wb') as token:
+        pickle.dump(creds, token)
+
+
+def _expires_soon(creds):
+    if creds.expiry is None:
+        return False
+    # google-auth keeps expiry as naive UTC
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return creds.expiry - now < CREDENTIALS_REFRESH_MARGIN
+
+
+def get_youtube_credentials(client_secrets_file='client_secrets.json'):
+    """Process-wide OAuth credentials, loaded on first use and refreshed ahead of their expiry"""
+    global _credentials
+    with _credentials_lock:
+        if _credentials is None:
+            _credentials = _load_credentials(client_secrets_file)
+        elif _credentials.refresh_token and _expires_soon(_credentials):
+            logging.info("Refreshing YouTube credentials ahead of expiry")
+            _credentials.refresh(Request())
+            _save_credentials(_credentials)
+        return _credentials
+
+
+def _get_discovery_document():
+    """YouTube v3 discovery document shipped with google-api-python-client, parsed once per process"""
+    global _discovery_document
+    if _discovery_document is None:
+        _discovery_document = json.loads(discovery_cache.get_static_doc('youtube', 'v3'))
+    return _discovery_document
+
+
+def get_youtube_service(client_secrets_file='client_secrets.json', timeout=None):
+    """
+    Authenticated YouTube service for the calling thread.
+    httplib2.Http is not thread-safe, so every thread gets its own transport,
+    while credentials and the parsed discovery document are shared by the whole process.
+    timeout: Socket timeout in seconds, so a stalled request raises instead of blocking the thread
+    """
+    creds = get_youtube_credentials(client_secrets_file)
+
+    cached = getattr(_thread_services, 'youtube', None)
+    if cached is None or cached[0] is not creds or cached[1] != timeout:
+        http = AuthorizedHttp(creds, http=httplib2.Http(timeout=timeout))
+        cached = (creds, timeout, build_from_document(_get_discovery_document(), http=http))
+        _thread_services.youtube = cached
+    return cached[2]
+
+
+def get_youtube_quota_limiter(script_config):
+    """Process-wide limiter shared by all YouTubePlaylistCreator instances"""
+    global _quota_limiter
+    youtube_config = script_config.get("YOUTUBE", {})
+    with _quota_limiter_lock:
+        if _quota_limiter is None:
+            requests_per_second = youtube_config.get("REQUESTS_PER_SECOND", 10)
+            _quota_limiter = QuotaLimiter(
+                requests_per_second=requests_per_second,
+                daily_units=youtube_config.get("DAILY_QUOTA_UNITS"),
+                # With RATE_LIMITS enabled the per-second limit and the daily units are shared by all worker processes
+                bucket=get_shared_bucket("youtube", requests_per_second, script_config),
+                daily_usage=get_shared_daily_quota("youtube", script_config)
+            )
+        return _quota_limiter
+
+
+def _longest_increasing_subsequence(values):
+    """Indices of one longest strictly increasing subsequence of values (patience sorting, O(n log n))"""
+    tails, tail_indices, previous = [], [], [None] * len(values)
+    for index, value in enumerate(values):
+        position = bisect.bisect_left(tails, value)
+        if position > 0:
+            previous[index] = tail_indices[position - 1]
+        if position == len(tails):
+            tails.append(value)
+            tail_indices.append(index)
+        else:
+            tails[position] = value
+            tail_indices[position] = index
+
+    result = []
+    index = tail_indices[-1] if tail_indices else None
+    while index is not None:
+        result.append(index)
+        index = previous[index]
+    return result[::-1]
+
+
+def plan_playlist_sync(current_items, target_video_ids):
+    """
+    Work out the minimal list of operations turning a playlist into target_video_ids.
+
+    Parameters:
+    - current_items: list of (playlist_item_id, video_id) in current playlist order
+    - target_video_ids: list of videoIds in desired order
+
+    Returns list of operations, to be applied in order:
+    - ('delete', playlist_item_id)
+    - ('move', playlist_item_id, video_id, position)
+    - ('insert', video_id, position)
+
+    Items already in the right relative order (longest increasing subsequence) are never touched.
+    """
+    target = list(dict.fromkeys(target_video_ids))
+    target_index = {video_id: index for index, video_id in enumerate(target)}
+
+    operations = []
+    kept = []
+    matched = set()
+    for item_id, video_id in current_items:
+        if video_id in target_index and video_id not in matched:
+            matched.add(video_id)
+            kept.append((item_id, video_id))
+        else:
+            operations.append(('delete', item_id))
+
+    stable = {kept[i][0] for i in _longest_increasing_subsequence([target_index[v] for _, v in kept])}
+    item_by_video = {video_id: item_id for item_id, video_id in kept}
+
+    # Simulate the playlist to turn "right after the previous target song" into absolute positions
+    playlist = [video_id for _, video_id in kept]
+    for index, video_id in enumerate(target):
+        item_id = item_by_video.get(video_id)
+        if item_id in stable:
+            continue
+
+        if item_id is not None:
+            playlist.remove(video_id)
+        position = playlist.index(target[index - 1]) + 1 if index > 0 else 0
+        playlist.insert(position, video_id)
+
+        if item_id is not None:
+            operations.append(('move', item_id, video_id, position))
+        else:
+            operations.append(('insert', video_id, position))
+
+    return operations
+
 
 class YouTubePlaylistCreator:
-    def __init__(self, api_key=None, client_secrets_file='client_secrets.json'):
+    def __init__(self, api_key=None, client_secrets_file='client_secrets.json', video_cache=None,
+                 quota_limiter=None, search_workers=5, prefetched_videos=None, request_timeout=None, health=None,
+                 telemetry=None, run_id=None):
         """
         Initialize YouTube API client
         api_key: For search-only operations (no playlist creation)
         client_secrets_file: For OAuth operations (playlist creation)
+        video_cache: Optional VideoIdCache checked before spending search quota
+        quota_limiter: Optional QuotaLimiter every API call goes through
+        search_workers: Number of concurrent video searches
+        prefetched_videos: Optional {song_key: Future of videoId} started while the voters were still running
+        request_timeout: Socket timeout of every API request in seconds
+        health: Optional ProviderHealth whose circuit breaker stops searches while YouTube keeps failing
+        telemetry: Optional Telemetry recording every API call (as stage youtube.<operation>) of run_id
         """
         self.api_key = api_key
         self.client_secrets_file = client_secrets_file
+        self.video_cache = video_cache
+        self.quota_limiter = quota_limiter
+        self.search_workers = search_workers
+        self.prefetched_videos = prefetched_videos or {}
+        self.request_timeout = request_timeout
+        self.health = health
+        self.telemetry = telemetry
+        self.run_id = run_id
         self.youtube = None
+        self.credentials = None
 
     def authenticate(self):
         """Authenticate using OAuth 2.0 for playlist creation"""
-        creds = None
-
-        # Token file stores the user's access and refresh tokens
-        if os.path.exists('token.pickle'):
-            with open('token.pickle', 'rb') as token:
-                creds = pickle.load(token)
-
-        # If there are no valid credentials, let the user log in
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    self.client_secrets_file, SCOPES)
-                creds = flow.run_local_server(port=0)
-
-            # Save the credentials for the next run
-            with open('token.pickle', 'wb') as token:
-                pickle.dump(creds, token)
-
-        self.youtube = build('youtube', 'v3', credentials=creds)
+        self.credentials = get_youtube_credentials(self.client_secrets_file)
+        self.youtube = get_youtube_service(self.client_secrets_file, self.request_timeout)
         logging.info("YouTube API authenticated successfully")
 
+    def _ensure_authenticated(self):
+        if not self.youtube:
+            self.authenticate()
+        elif self.credentials is not None:
+            # Refresh before the playlist requests start rather than in the middle of them
+            get_youtube_credentials(self.client_secrets_file)
+
+    def _thread_youtube(self):
+        """Service bound to the calling thread, see get_youtube_service"""
+        if self.credentials is None:
+            return self.youtube
+        return get_youtube_service(self.client_secrets_file, self.request_timeout)
+
+    def _acquire_quota(self, units):
+        if self.quota_limiter is not None:
+            self.quota_limiter.acquire(units)
+
+    def _execute(self, operation, request, units=None):
+        """Execute an API request (or batch), recording its wall time and quota units"""
+        with timed(self.telemetry, f"youtube.{operation}", self.run_id, provider="youtube", quota_units=units):
+            return request.execute()
+
+    def _search_video(self, song_title, artist):
+        """Call search().list for a song, errors are left to the caller"""
+        search_query = f"{song_title} {artist}"
+
+        if self.health is not None and not self.health.allow():
+            raise CircuitOpenError(f"YouTube circuit is open, not searching for: {search_query}")
+
+        self._acquire_quota(SEARCH_COST)
+        request = self._thread_youtube().search().list(
+            part='snippet',
+            q=search_query,
+            type='video',
+            maxResults=1,
+            videoCategoryId='10'  # Music category
+        )
+
+        if self.health is not None:
+            response = self.health.track(lambda: self._execute('search', request, SEARCH_COST))
+        else:
+            response = self._execute('search', request, SEARCH_COST)
+
+        if response['items']:
+            video_id = response['items'][0]['id']['videoId']
+            video_title = response['items'][0]['snippet']['title']
+            logging.info(f"Found: {video_title} (ID: {video_id})")
+            return video_id
+        else:
+            logging.warning(f"No video found for: {search_query}")
+            return None
+
     def search_video(self, song_title, artist):
         """Search for a video by song title and artist"""
         try:
-            search_query = f"{song_title} {artist}"
+            return self._search_video(song_title, artist)
 
-            request = self.youtube.search().list(
-                part='snippet',
-                q=search_query,
-                type='video',
-                maxResults=1,
-                videoCategoryId='10'  # Music category
-            )
-
-            response = request.execute()
+        except Exception as e:
+            logging.error(f"Error searching for {song_title} by {artist}: {e}")
+            return None
 
-            if response['items']:
-                video_id = response['items'][0]['id']['videoId']
-                video_title = response['items'][0]['snippet']['title']
-                logging.info(f"Found: {video_title} (ID: {video_id})")
-                return video_id
+    def resolve_video(self, song_title, artist):
+        """Resolve a song to videoId using the local cache first and the search API only on a miss"""
+        prefetched = self.prefetched_videos.get(song_key(song_title, artist))
+        if prefetched is not None:
+            try:
+                video_id = prefetched.result()
+            except Exception as e:
+                logging.error(f"Prefetched search for {song_title} by {artist} failed: {e}")
             else:
-                logging.warning(f"No video found for: {search_query}")
-                return None
+                if video_id:
+                    return video_id
+                # A failed or empty streamed search gets a second chance below
+                logging.info(f"Prefetched search found nothing for {song_title} by {artist}, resolving again")
+
+        if self.video_cache is None:
+            return self.search_video(song_title, artist)
+
+        # Its own stage: youtube.search only counts API calls, cache_lookup calls and cache_hits give the hit rate
+        with timed(self.telemetry, "youtube.cache_lookup", self.run_id, provider="youtube") as event:
+            hit, video_id = self.video_cache.lookup(song_title, artist)
+            event["cache_hit"] = hit
+        if hit:
+            logging.info(f"Video cache hit for: {song_title} {artist}")
+            return video_id
 
+        try:
+            video_id = self._search_video(song_title, artist)
         except Exception as e:
+            # Do not cache API errors as "not found"
             logging.error(f"Error searching for {song_title} by {artist}: {e}")
             return None
 
+        self.video_cache.store(song_title, artist, video_id)
+        return video_id
+
     def create_playlist(self, title, description=""):
         """Create a new YouTube playlist"""
         try:
+            self._acquire_quota(WRITE_COST)
             request = self.youtube.playlists().insert(
                 part='snippet,status',
                 body={
@@ -94,7 +364,7 @@ class YouTubePlaylistCreator:
                 }
             )
 
-            response = request.execute()
+            response = self._execute('create_playlist', request, WRITE_COST)
             playlist_id = response['id']
             logging.info(f"Playlist created: {title} (ID: {playlist_id})")
             return playlist_id
@@ -103,23 +373,28 @@ class YouTubePlaylistCreator:
             logging.error(f"Error creating playlist: {e}")
             return None
 
-    def add_video_to_playlist(self, playlist_id, video_id):
-        """Add a video to a playlist"""
+    def _playlist_item_body(self, playlist_id, video_id, position=None):
+        snippet = {
+            'playlistId': playlist_id,
+            'resourceId': {
+                'kind': 'youtube#video',
+                'videoId': video_id
+            }
+        }
+        if position is not None:
+            snippet['position'] = position
+        return {'snippet': snippet}
+
+    def add_video_to_playlist(self, playlist_id, video_id, position=None):
+        """Add a video to a playlist (at the end unless position is given)"""
         try:
+            self._acquire_quota(WRITE_COST)
             request = self.youtube.playlistItems().insert(
                 part='snippet',
-                body={
-                    'snippet': {
-                        'playlistId': playlist_id,
-                        'resourceId': {
-                            'kind': 'youtube#video',
-                            'videoId': video_id
-                        }
-                    }
-                }
+                body=self._playlist_item_body(playlist_id, video_id, position)
             )
 
-            response = request.execute()
+            response = self._execute('insert_item', request, WRITE_COST)
             logging.info(f"Video {video_id} added to playlist {playlist_id}")
             return True
 
@@ -127,6 +402,164 @@ class YouTubePlaylistCreator:
             logging.error(f"Error adding video to playlist: {e}")
             return False
 
+    def add_videos_to_playlist(self, playlist_id, video_ids):
+        """
+        Add videos to a playlist using batch requests (BATCH_SIZE inserts per HTTP call).
+        The server may run the inserts of a batch in any order, so they are appended without positions,
+        items rejected by the batch are retried one by one, and a plan_playlist_sync pass then moves
+        the items into the order of video_ids.
+        Returns a list of booleans aligned with video_ids.
+        """
+        results = [False] * len(video_ids)
+
+        def on_response(request_id, response, exception):
+            index = int(request_id)
+            if exception is not None:
+                logging.warning(f"Batch insert of {video_ids[index]} failed: {exception}")
+            else:
+                results[index] = True
+                logging.info(f"Video {video_ids[index]} added to playlist {playlist_id}")
+
+        try:
+            for start in range(0, len(video_ids), BATCH_SIZE):
+                batch = self.youtube.new_batch_http_request(callback=on_response)
+                batch_size = 0
+                try:
+                    for index in range(start, min(start + BATCH_SIZE, len(video_ids))):
+                        self._acquire_quota(WRITE_COST)
+                        batch.add(
+                            self.youtube.playlistItems().insert(
+                                part='snippet',
+                                body=self._playlist_item_body(playlist_id, video_ids[index])
+                            ),
+                            request_id=str(index)
+                        )
+                        batch_size += 1
+                finally:
+                    # Inserts already paid for are still sent when the quota runs out mid-batch
+                    if batch_size:
+                        try:
+                            self._execute('insert_batch', batch, WRITE_COST * batch_size)
+                        except Exception as e:
+                            logging.error(f"Error executing playlist batch: {e}")
+        except QuotaExceededError as e:
+            logging.error(f"Stopped adding videos to playlist {playlist_id}: {e}")
+        else:
+            # Retry failures one by one, their order is fixed below like the rest
+            for index, video_id in enumerate(video_ids):
+                if not results[index]:
+                    results[index] = self.add_video_to_playlist(playlist_id, video_id)
+
+        self._reorder_playlist(playlist_id, [video_id for video_id, added in zip(video_ids, results) if added])
+        return results
+
+    def _reorder_playlist(self, playlist_id, video_ids):
+        """Move the items of a playlist into the order of video_ids, with the moves plan_playlist_sync finds"""
+        try:
+            current_items = self.list_playlist_items(playlist_id)
+        except Exception as e:
+            logging.error(f"Error listing playlist {playlist_id}, its order is left as inserted: {e}")
+            return
+
+        for operation in plan_playlist_sync(current_items, video_ids):
+            # Positions are computed assuming every previous operation succeeded
+            if not self._apply_sync_operation(playlist_id, operation):
+                logging.error(f"Reordering playlist {playlist_id} interrupted, its order is left as is")
+                return
+
+    def _resolve_dataframe(self, df, song_col, artist_col):
+        """Search all songs concurrently, map() keeps results in the DataFrame (total_points) order"""
+        songs = list(zip(df[song_col], df[artist_col]))
+        for song_title, artist in songs:
+            print(f"Searching for: {song_title} by {artist}...")
+
+        with ThreadPoolExecutor(max_workers=self.search_workers) as executor:
+            video_ids = list(executor.map(lambda song: self.resolve_video(*song), songs))
+
+        return songs, video_ids
+
+    def list_playlist_items(self, playlist_id):
+        """Page through a playlist and return (playlist_item_id, video_id) in playlist order"""
+        items = []
+        page_token = None
+        while True:
+            self._acquire_quota(1)
+            response = self._execute('list_items', self.youtube.playlistItems().list(
+                part='snippet',
+                playlistId=playlist_id,
+                maxResults=50,
+                pageToken=page_token
+            ), 1)
+
+            for item in response.get('items', []):
+                items.append((item['id'], item['snippet']['resourceId']['videoId']))
+
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return items
+
+    def _apply_sync_operation(self, playlist_id, operation):
+        try:
+            self._acquire_quota(WRITE_COST)
+            if operation[0] == 'delete':
+                self._execute('delete_item', self.youtube.playlistItems().delete(id=operation[1]), WRITE_COST)
+            elif operation[0] == 'move':
+                _, item_id, video_id, position = operation
+                body = self._playlist_item_body(playlist_id, video_id, position)
+                body['id'] = item_id
+                self._execute('move_item', self.youtube.playlistItems().update(part='snippet', body=body), WRITE_COST)
+            else:
+                _, video_id, position = operation
+                self._execute('insert_item', self.youtube.playlistItems().insert(
+                    part='snippet',
+                    body=self._playlist_item_body(playlist_id, video_id, position)
+                ), WRITE_COST)
+            return True
+
+        except Exception as e:
+            logging.error(f"Error applying {operation} to playlist {playlist_id}: {e}")
+            return False
+
+    def sync_playlist_from_dataframe(self, df, playlist_id,
+                                     song_col='song_title',
+                                     artist_col='artist'):
+        """
+        Update an existing YouTube playlist so it matches the DataFrame,
+        sending only the deletes, moves and inserts that are actually needed.
+        """
+        self._ensure_authenticated()
+
+        songs, video_ids = self._resolve_dataframe(df, song_col, artist_col)
+        failed_songs = [f"{song_title} - {artist}" for (song_title, artist), video_id in zip(songs, video_ids)
+                        if not video_id]
+
+        try:
+            current_items = self.list_playlist_items(playlist_id)
+        except Exception as e:
+            logging.error(f"Error listing playlist {playlist_id}: {e}")
+            return None
+
+        operations = plan_playlist_sync(current_items, [video_id for video_id in video_ids if video_id])
+        applied = 0
+        for operation in operations:
+            # Positions are computed assuming every previous operation succeeded
+            if not self._apply_sync_operation(playlist_id, operation):
+                logging.error("Playlist sync interrupted, it will be corrected on the next run")
+                break
+            applied += 1
+
+        print(f"\n✅ Playlist synced successfully!")
+        print(f"📊 Applied {applied}/{len(operations)} changes "
+              f"({len(current_items)} songs before, {len(df) - len(failed_songs)} songs targeted)")
+        print(f"🔗 Playlist URL: https://www.youtube.com/playlist?list={playlist_id}")
+
+        if failed_songs:
+            print(f"\n⚠️  Failed to find {len(failed_songs)} songs:")
+            for song in failed_songs:
+                print(f"  - {song}")
+
+        return playlist_id
+
     def create_playlist_from_dataframe(self, df, playlist_name,
                                        song_col='song_title',
                                        artist_col='artist',
@@ -140,8 +573,7 @@ class YouTubePlaylistCreator:
         - song_col: Column name containing song titles
         - artist_col: Column name containing artist names
         """
-        if not self.youtube:
-            self.authenticate()
+        self._ensure_authenticated()
 
         # Create the playlist
         playlist_id = self.create_playlist(playlist_name, description)
@@ -153,19 +585,15 @@ class YouTubePlaylistCreator:
         added_count = 0
         failed_songs = []
 
-        # Search and add each song
-        for idx, row in df.iterrows():
-            song_title = row[song_col]
-            artist = row[artist_col]
+        songs, video_ids = self._resolve_dataframe(df, song_col, artist_col)
 
-            print(f"Searching for: {song_title} by {artist}...")
-            video_id = self.search_video(song_title, artist)
+        # Add all found songs in one batch, keeping their order
+        found_video_ids = [video_id for video_id in video_ids if video_id]
+        inserted = iter(self.add_videos_to_playlist(playlist_id, found_video_ids))
 
-            if video_id:
-                if self.add_video_to_playlist(playlist_id, video_id):
-                    added_count += 1
-                else:
-                    failed_songs.append(f"{song_title} - {artist}")
+        for (song_title, artist), video_id in zip(songs, video_ids):
+            if video_id and next(inserted):
+                added_count += 1
             else:
                 failed_songs.append(f"{song_title} - {artist}")
 
@@ -180,31 +608,107 @@ class YouTubePlaylistCreator:
 
         return playlist_id
 
-def analyze_responses(state: State, current_time: str) -> dict:
-    """Prepare context for Google to analyze"""
-    recommendations_df = pd.DataFrame()
-    for model in ['anthropic', 'openai', 'google_genai']:
-        single_recommendation_df = pd.DataFrame(state[f'{model}_response']['recommendations'])
-        single_recommendation_df['model'] = model
-        recommendations_df = pd.concat([recommendations_df, single_recommendation_df])
+def analyze_responses(state: State, current_time: str = None, script_config=None) -> dict:
+    """Aggregate the voters' ballots and turn the top songs into a YouTube playlist"""
+    script_config = script_config or {}
+    current_time = current_time or get_run_timestamp(state)
+    telemetry = get_telemetry(script_config)
+
+    try:
+        with timed(telemetry, "analyze", state.get('run_id')):
+            result = _analyze_responses(state, current_time, script_config, telemetry)
+    finally:
+        # A run failing before the playlist step still releases its streaming resolver
+        discard_prefetched_videos(state.get('run_id'))
+
+    if telemetry is not None:
+        result['run_metrics'] = telemetry.finish_run(state.get('run_id'), current_time,
+                                                     write_metrics=writes_run_artifacts(script_config))
+
+    run_store = get_run_store(script_config)
+    if run_store is not None:
+        # The whole run goes in as one batch, once the playlist is known
+        try:
+            run_store.write_run(
+                run_id=state.get('run_id') or current_time,
+                current_time=current_time,
+                ballots=state.get('responses', {}),
+                recommendations=pd.DataFrame(result['final_recommendations']),
+                voter_status={voter: state.get('voter_status', {}).get(voter, VOTED)
+                              for voter in state.get('responses', {})},
+                participants=result['participants'],
+                user_question=state.get('user_question'),
+                prompt_attributes=state.get('prompt_attributes'),
+                playlist_name=state.get('playlist_name'),
+                playlist_id=result['playlist_id'],
+                metrics=result.get('run_metrics'),
+                replay_of=state.get('replay_of')
+            )
+        except Exception as e:
+            logging.error(f"Could not store run {current_time}: {e}")
+    return result
+
+
+def _analyze_responses(state, current_time, script_config, telemetry):
+    close_run_quorum(state.get('run_id'))
+
+    # Voters that were dropped, timed out or failed leave empty ballots behind
+    ballots = state.get('responses', {})
+    voter_status = state.get('voter_status', {})
+    participants = [voter for voter, ballot in ballots.items()
+                    if ballot['recommendations'] and voter_status.get(voter, VOTED) in PARTICIPATING_STATUSES]
+    if not participants:
+        raise ValueError(f"No voter returned a ballot: {voter_status}")
+
+    weights = provider_weights(script_config)
+    configured_voters = len(weights) or len(ballots)
+    logging.info(f"Aggregating ballots of {len(participants)}/{configured_voters} voters: {participants}")
+
+    batch = build_ballot_batch({current_time: {voter: ballots[voter] for voter in participants}})
 
-    final_recommendations_df = recommendations_df.groupby(['song_title', 'artist', 'album', 'year'])['rank'].sum().reset_index()
-    final_recommendations_df.columns = ['song_title', 'artist', 'album', 'year', 'total_points']
-    final_recommendations_df = final_recommendations_df.sort_values(by='total_points', ascending=False)
+    final_recommendations_df = aggregate_configured_ballots(batch, script_config)
+    # Scale the points up by the weight of the missing ballots so scores stay comparable between runs
+    configured_weight = sum(weights.values()) if weights else len(ballots)
+    participating_weight = sum(weights.get(voter, 1.0) for voter in participants)
+    if participating_weight:
+        final_recommendations_df['total_points'] *= configured_weight / participating_weight
 
-    final_recommendations_df.to_csv(f'model_outputs/{current_time}/final_recommendations_df_{current_time}.csv')
+    if writes_run_artifacts(script_config):
+        output_dir = PROJECT_ROOT / 'model_outputs' / current_time
+        output_dir.mkdir(parents=True, exist_ok=True)
+        final_recommendations_df.to_csv(output_dir / f'final_recommendations_df_{current_time}.csv', index=False)
 
     # Create YouTube playlist
 
-    youtube_creator = YouTubePlaylistCreator()
-    playlist_id = youtube_creator.create_playlist_from_dataframe(
-        df=final_recommendations_df.head(20),  # Top 10 recommendations
-        playlist_name=create_playlist_name(state['user_question']),
-        song_col='song_title',
-        artist_col='artist'
+    youtube_creator = YouTubePlaylistCreator(
+        video_cache=get_video_cache(script_config),
+        quota_limiter=get_youtube_quota_limiter(script_config),
+        search_workers=script_config.get("YOUTUBE", {}).get("SEARCH_WORKERS", 5),
+        prefetched_videos=pop_prefetched_videos(state.get('run_id')),
+        request_timeout=script_config.get("YOUTUBE", {}).get("TIMEOUT_SECONDS"),
+        health=get_provider_health("youtube", script_config),
+        telemetry=telemetry,
+        run_id=state.get('run_id')
     )
+    # Refresh an existing playlist in place when asked to, otherwise create a new one
+    sync_playlist_id = state.get('sync_playlist_id') or script_config.get("YOUTUBE", {}).get("SYNC_PLAYLIST_ID")
+    if sync_playlist_id:
+        playlist_id = youtube_creator.sync_playlist_from_dataframe(
+            df=final_recommendations_df.head(20),
+            playlist_id=sync_playlist_id,
+            song_col='song_title',
+            artist_col='artist'
+        )
+    else:
+        playlist_id = youtube_creator.create_playlist_from_dataframe(
+            df=final_recommendations_df.head(20),  # Top 10 recommendations
+            playlist_name=state.get('playlist_name') or template_playlist_name(state.get('prompt_attributes', {})),
+            song_col='song_title',
+            artist_col='artist'
+        )
 
     return {
         'final_recommendations': final_recommendations_df.to_dict(),
+        'participants': participants,
         'playlist_id': playlist_id
     }
\ No newline at end of file
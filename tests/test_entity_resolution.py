@@ -0,0 +1,77 @@
+from src.entity_resolution import SongIndex
+
+
+def test_numbered_parts_are_not_merged():
+    index = SongIndex()
+    part_1 = index.resolve("Another Brick in the Wall, Pt. 1", "Pink Floyd", ballot="anthropic")
+    part_2 = index.resolve("Another Brick in the Wall, Pt. 2", "Pink Floyd", ballot="openai")
+    assert part_1 != part_2
+
+
+def test_numbered_works_are_not_merged():
+    index = SongIndex()
+    fifth = index.resolve("Symphony No. 5", "Ludwig van Beethoven", ballot="anthropic")
+    ninth = index.resolve("Symphony No. 9", "Ludwig van Beethoven", ballot="openai")
+    assert fifth != ninth
+
+
+def test_roman_numerals_are_not_merged():
+    index = SongIndex()
+    assert index.resolve("Part II", "Paramore") != index.resolve("Part III", "Paramore")
+
+
+def test_distinct_benchmark_titles_stay_distinct():
+    index = SongIndex()
+    keys = {index.resolve(f"Benchmark Song {song:02d}", "Benchmark Artist", ballot="openai") for song in range(10)}
+    assert len(keys) == 10
+
+
+def test_same_ballot_is_never_merged():
+    index = SongIndex()
+    first = index.resolve("Song for Guy", "Elton John", ballot="openai")
+    second = index.resolve("Song for a Guy", "Elton John", ballot="openai")
+    assert first != second
+    # The same pair from two voters is one song
+    assert index.resolve("Song for a Guy", "Elton John", ballot="anthropic") in (first, second)
+
+
+def test_spelling_variants_of_different_voters_are_merged():
+    index = SongIndex()
+    first = index.resolve("Bohemian Rhapsody - Remastered 2011", "Queen", ballot="anthropic")
+    second = index.resolve("Bohemian Rapsody", "Queen", ballot="openai")
+    assert first == second
+
+
+class CountingSongIndex(SongIndex):
+    # Small blocks fill up after a few hundred candidates, which keeps the test fast
+    BLOCK_LIMIT = 8
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.comparisons = 0
+
+    def _similarity(self, left, right, threshold=0.0):
+        self.comparisons += 1
+        return super()._similarity(left, right, threshold)
+
+
+def _catalogue(songs):
+    """Many distinct titles of a single artist, the worst case for blocking on the artist"""
+    words = ["night", "drive", "neon", "heart", "city", "lights", "summer", "dream", "fire", "ocean", "echo", "glass",
+             "river", "storm", "velvet", "wave"]
+    return [(f"{words[song % 16]} {words[song // 16 % 16]} {words[song // 256 % 16]}", "Prolific Artist")
+            for song in range(songs)]
+
+
+def test_comparisons_grow_linearly():
+    comparisons = []
+    for songs in (400, 1600):
+        index = CountingSongIndex()
+        for ballot, (song_title, artist) in enumerate(_catalogue(songs)):
+            index.resolve(song_title, artist, ballot=ballot)
+        comparisons.append(index.comparisons)
+
+    # Every candidate compares with at most BLOCK_LIMIT members of each of its blocks, title and artist each
+    assert comparisons[1] <= 1600 * 3 * CountingSongIndex.BLOCK_LIMIT * 2
+    # Four times the candidates, about four times the work (quadratic would be sixteen)
+    assert comparisons[1] <= 5 * comparisons[0]